@@ -2,15 +2,19 @@
 # @File    : app.py
 # @Description: Main application file
 
+import os
+import re
 import streamlit as st
 import logging
-import re
+from copy import copy
+from typing import Optional, Tuple
 from Agentic_RAG.config.settings import (
     DEFAULT_MODEL,
     AVAILABLE_MODELS,
     DEFAULT_SIMILARITY_THRESHOLD,
     EMBEDDING_MODEL,
-    AVAILABLE_EMBEDDING_MODELS
+    AVAILABLE_EMBEDDING_MODELS,
+    VECTOR_STORE_PATH
 )
 # RAGAgent: Agent to handle user input and generate responses, encapsulating model interaction logic.
 from Agentic_RAG.models.agent import RAGAgent
@@ -28,6 +32,65 @@ from Agentic_RAG.utils.decorators import error_handler, log_execution
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Session state defaults; values are copied per session so mutable ones are not shared
+_SESSION_DEFAULTS = {
+    'model_version': DEFAULT_MODEL,  # Default model
+    'processed_documents': [],  # Processed document list
+    'similarity_threshold': DEFAULT_SIMILARITY_THRESHOLD,  # Default similarity threshold
+    'rag_enabled': True,  # Enable RAG by default
+    'embedding_model': EMBEDDING_MODEL,  # Default embedding model
+}
+
+# Reasoning segment tags emitted by reasoning-capable models
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+
+def _split_think(response: str) -> Tuple[Optional[str], str]:
+    """
+    Separate <think>...</think> segments from a model reply with a linear str.find scan
+
+    @param response - Raw model reply
+    @return (reasoning content or None, reply without reasoning segments)
+    """
+    thoughts, parts = [], []
+    pos = 0
+    while True:
+        start = response.find(_THINK_OPEN, pos)
+        if start < 0:
+            break
+        end = response.find(_THINK_CLOSE, start + len(_THINK_OPEN))
+        if end < 0:
+            # Unterminated tag: leave the remainder untouched
+            break
+        parts.append(response[pos:start])
+        thoughts.append(response[start + len(_THINK_OPEN):end].strip())
+        pos = end + len(_THINK_CLOSE)
+    if not thoughts:
+        return None, response
+    parts.append(response[pos:])
+    return "\n\n".join(thoughts), "".join(parts).strip()
+
+# Agents are reused across reruns and sessions; the model version is the cache key
+@st.cache_resource
+def get_agent(model_version: str) -> RAGAgent:
+    return RAGAgent(model_version)
+
+# The vector store, chat history and document processor are global resources; build them once, not on every rerun.
+# Vector stores are keyed on the embedding model, each with its own index directory, so one session's
+# model choice never changes the embeddings another session queries or indexes with.
+@st.cache_resource
+def get_vector_store(embedding_model: str) -> VectorStoreService:
+    index_dir = os.path.join(VECTOR_STORE_PATH, re.sub(r"[^\w.-]", "_", embedding_model))
+    return VectorStoreService(index_dir=index_dir, embedding_model=embedding_model)
+
+@st.cache_resource
+def get_chat_history() -> ChatHistoryManager:
+    return ChatHistoryManager()
+
+@st.cache_resource
+def get_document_processor() -> DocumentProcessor:
+    return DocumentProcessor()
+
 class App:
     """
     Main RAG application class
@@ -37,24 +100,16 @@ class App:
         @description Initialize the application
         """
         self._init_session_state()  # Initialize session state
-        self.chat_history = ChatHistoryManager()  # Create chat history manager
-        self.document_processor = DocumentProcessor()  # Create document processor
-        self.vector_store = VectorStoreService()  # Create vector store service
+        self.chat_history = get_chat_history()  # Get chat history manager
+        self.document_processor = get_document_processor()  # Get document processor
+        self.vector_store = get_vector_store(st.session_state.embedding_model)  # Get this session's vector store service
         logger.info("Application initialized successfully")
     
     # 1. Initialize session state
     @error_handler(show_error=False)
     def _init_session_state(self):
-        if 'model_version' not in st.session_state:
-            st.session_state.model_version = DEFAULT_MODEL  # Set default model
-        if 'processed_documents' not in st.session_state:
-            st.session_state.processed_documents = []  # Initialize processed document list
-        if 'similarity_threshold' not in st.session_state:
-            st.session_state.similarity_threshold = DEFAULT_SIMILARITY_THRESHOLD  # Set default similarity threshold
-        if 'rag_enabled' not in st.session_state:
-            st.session_state.rag_enabled = True  # Enable RAG by default
-        if 'embedding_model' not in st.session_state:
-            st.session_state.embedding_model = EMBEDDING_MODEL  # Set default embedding model
+        for key, value in _SESSION_DEFAULTS.items():
+            st.session_state.setdefault(key, copy(value))
     
     # 2. Render sidebar
     @error_handler()
@@ -79,15 +134,16 @@ class App:
             DEFAULT_SIMILARITY_THRESHOLD
         )
         
-        # Update the embedding model used by the vector store service
+        # Switch this session to the vector store service of the new embedding model
         if previous_embedding_model != st.session_state.embedding_model:
-            if self.vector_store.update_embedding_model(st.session_state.embedding_model):
-                # If a vector store already exists, remind the user to reprocess documents for the new embedding model
-                if len(st.session_state.processed_documents) > 0:
-                    st.sidebar.info(f"⚠️ Embedding model has changed to {st.session_state.embedding_model}. You may need to reprocess documents to use the new embedding model.")
+            self.vector_store = get_vector_store(st.session_state.embedding_model)
+            logger.info(f"Embedding model updated to: {st.session_state.embedding_model}")
+            # Each embedding model has its own index; remind the user to reprocess documents for the new one
+            if len(st.session_state.processed_documents) > 0:
+                st.info(f"⚠️ Embedding model has changed to {st.session_state.embedding_model}. You may need to reprocess documents to use the new embedding model.")
         
         # Render chat statistics
-        UIComponents.render_chat_stats(self.chat_history)
+        UIComponents.render_chat_stats(self.chat_history, self.vector_store)
     
 
     # 3. Render document upload area
@@ -133,8 +189,8 @@ class App:
             logger.info(f"Number of retrieved documents: {len(docs)}")  
             # Build document context
             context = self.vector_store.get_context(docs)  
-            # Create RAG agent
-            agent = RAGAgent(st.session_state.model_version)  
+            # Get RAG agent
+            agent = get_agent(st.session_state.model_version)  
             # Run agent to get response
             response = agent.run(  
                 prompt, 
@@ -152,8 +208,8 @@ class App:
         prompt - User input text
         """
         with st.spinner("🤖 Thinking..."): 
-            # Create RAG agent
-            agent = RAGAgent(st.session_state.model_version)  
+            # Get RAG agent
+            agent = get_agent(st.session_state.model_version)  
             # Run agent to get response
             response = agent.run(prompt)  
             # Process response
@@ -167,24 +223,39 @@ class App:
         docs - Retrieved documents (optional)
         """
         # 7.1 Handle the reasoning segment in the response
-        think_pattern = r'<think>([\s\S]*?)</think>'  # Define regex pattern for reasoning content
-        think_match = re.search(think_pattern, response)  # Search for reasoning content
-        if think_match:
-            think_content = think_match.group(1).strip()  # Extract reasoning content
-            response_wo_think = re.sub(think_pattern, '', response).strip()  # Remove reasoning section
-        else:
-            think_content = None
-            response_wo_think = response
+        think_content, response_wo_think = _split_think(response)  # Extract and remove reasoning content
         
         # 7.2 Save the response to history
         self.chat_history.add_message("assistant", response_wo_think)  # Add assistant reply
         if think_content:
             self.chat_history.add_message("assistant_think", think_content)  # Add reasoning content
         if docs:
-            doc_contents = [doc.page_content for doc in docs]  # Extract document content
-            # Store retrieved documents as a single string entry in history
-            combined_docs = "\n---\n".join(doc_contents)
-            self.chat_history.add_message("retrieved_doc", combined_docs)  # Add retrieved documents
+            # Store docstore ids only; chunk text is looked up from the vector store on display
+            self.chat_history.add_retrieved_docs([doc.id for doc in docs])  # Add retrieved documents
+
+
+    # 8. Sidebar fragment: sidebar widget changes rerun only the sidebar
+    @st.fragment
+    def _sidebar_fragment(self):
+        rag_enabled = st.session_state.rag_enabled
+        self.render_sidebar()  # Render sidebar
+        if st.session_state.rag_enabled != rag_enabled:
+            # The chat input placeholder and mode banner depend on the RAG toggle
+            st.rerun()
+
+
+    # 9. Chat fragment: a new prompt reruns only the chat input and history
+    @st.fragment
+    def _chat_fragment(self):
+        prompt = st.chat_input(  # Create chat input
+            "Ask about your documents..." if st.session_state.rag_enabled else "Ask me anything..."
+        )
+        
+        if prompt:
+            self.process_user_input(prompt)  # Process user input
+            
+        # Render chat history
+        UIComponents.render_chat_history(self.chat_history, self.vector_store)
 
 
     # Entry point: run the application
@@ -194,20 +265,13 @@ class App:
         st.title("🐋 Qwen 3 Local RAG Reasoning Agent")  # Set application title
         st.info("**Qwen3:** The latest generation of the Qwen series LLMs, offering a comprehensive suite of dense and Mixture-of-Experts (MoE) models.")  # Show model info
         
-        self.render_sidebar()  # Render sidebar
+        with st.sidebar:
+            self._sidebar_fragment()  # Render sidebar
         self.render_document_upload()  # Render document upload area
         
         chat_col = st.columns([1])[0]  # Create chat column
         with chat_col:
-            prompt = st.chat_input(  # Create chat input
-                "Ask about your documents..." if st.session_state.rag_enabled else "Ask me anything..."
-            )
-            
-            if prompt:
-                self.process_user_input(prompt)  # Process user input
-                
-            # Render chat history
-            UIComponents.render_chat_history(self.chat_history)
+            self._chat_fragment()  # Render chat input and history
         
         mode_description = ""
         if st.session_state.rag_enabled:
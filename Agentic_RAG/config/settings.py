@@ -4,7 +4,7 @@ Configuration file containing all constants and settings.
 
 # 1. File paths
 VECTOR_STORE_PATH = "faiss_index"
-HISTORY_FILE = "chat_history.json"
+HISTORY_FILE = "chat_history.jsonl"  # One JSON message per line, append-only
 
 # 2. Model configuration
 DEFAULT_MODEL = "qwen3:8b"
@@ -13,6 +13,8 @@ AVAILABLE_MODELS = ["qwen3:1.7b", "deepseek-r1:1.5b", "qwen3:8b"]
 EMBEDDING_MODEL = "bge-m3:latest"
 AVAILABLE_EMBEDDING_MODELS = ["bge-m3:latest", "nomic-embed-text:latest", "mxbai-embed-large:latest", "bge-large-en-v1.5:latest", "bge-large-zh-v1.5:latest"]
 EMBEDDING_BASE_URL = "http://localhost:11434"
+EMBEDDING_BATCH_SIZE = 32  # Texts per embedding request
+EMBEDDING_MAX_CONCURRENCY = 8  # Embedding requests in flight at once
 
 
 # 3. RAG configuration
@@ -28,6 +30,19 @@ AMAP_API_KEY = "48257ed7b33d55e349260a9837436968"
 CHUNK_SIZE = 300
 CHUNK_OVERLAP = 30
 SEPARATORS = ["\n\n", "\n", "。", "！", "？", ".", "!", "?", " ", ""]
+PARALLEL_SPLIT_MIN_DOCS = 4  # Split in a process pool once a batch has this many documents
 
 # 6. Chat history configuration
-MAX_HISTORY_TURNS = 5 
\ No newline at end of file
+MAX_HISTORY_TURNS = 5
+
+# 7. FAISS index configuration
+FAISS_IVFPQ_MIN_VECTORS = 10000  # Below this many chunks an int8 scalar-quantized index is used
+FAISS_IVF_NLIST = None  # None -> int(4 * sqrt(N)), capped so every list gets enough training points
+FAISS_IVF_NPROBE = None  # None -> max(1, nlist // 16)
+FAISS_PQ_M = 32  # Number of PQ sub-quantizers; must divide the embedding dimension
+FAISS_PQ_NBITS = 8
+FAISS_RETRAIN_GROWTH = 4  # Retrain the index once it holds this many times the vectors it was trained on
+
+# 8. Binary quantization (first-stage Hamming search, rerank against the FAISS index)
+BINARY_SEARCH_ENABLED = True
+BINARY_OVERSAMPLE = 4  # Candidates fetched per result before the rerank against the quantized index
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Embedding client module
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import List
+
+from langchain_ollama import OllamaEmbeddings
+
+logger = logging.getLogger(__name__)
+
+class BatchedOllamaEmbeddings(OllamaEmbeddings):
+    """
+    OllamaEmbeddings that embeds large inputs as concurrent mini-batches
+    """
+    batch_size: int = 32
+    max_concurrency: int = 8
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        texts - Texts to embed
+
+        @return Embeddings in the same order as texts
+        """
+        if len(texts) <= self.batch_size:
+            return super().embed_documents(texts)
+
+        # Sort by length so each batch holds similarly sized texts
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [
+            [texts[i] for i in order[start:start + self.batch_size]]
+            for start in range(0, len(order), self.batch_size)
+        ]
+
+        # The sync Ollama client is thread-safe; its async client is bound to a single event loop
+        embed_batch = super().embed_documents
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            batch_results = executor.map(embed_batch, batches)
+            embeddings: List[List[float]] = [None] * len(texts)
+            for i, vector in zip(order, chain.from_iterable(batch_results)):
+                embeddings[i] = vector
+
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return embeddings
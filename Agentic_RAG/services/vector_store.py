@@ -3,66 +3,115 @@
 Vector store service module
 """
 import os
-from typing import List, Optional, Dict, Any
+import atexit
+import json
+import math
+import pickle
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import List, Optional, Dict, Any, Tuple
 import logging
 from pathlib import Path
 from Agentic_RAG.utils.decorators import error_handler, log_execution
 
+import faiss
+import numpy as np
+import streamlit as st
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_core.documents import Document
-from langchain_ollama import OllamaEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from Agentic_RAG.services.embeddings import BatchedOllamaEmbeddings
 from Agentic_RAG.config.settings import (
         EMBEDDING_MODEL,
         EMBEDDING_BASE_URL,
+        EMBEDDING_BATCH_SIZE,
+        EMBEDDING_MAX_CONCURRENCY,
         MAX_RETRIEVED_DOCS,
         CHUNK_SIZE,
         CHUNK_OVERLAP,
-        SEPARATORS
+        SEPARATORS,
+        PARALLEL_SPLIT_MIN_DOCS,
+        FAISS_IVFPQ_MIN_VECTORS,
+        FAISS_IVF_NLIST,
+        FAISS_IVF_NPROBE,
+        FAISS_PQ_M,
+        FAISS_PQ_NBITS,
+        FAISS_RETRAIN_GROWTH,
+        BINARY_SEARCH_ENABLED,
+        BINARY_OVERSAMPLE
 )
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Embedding clients are shared across reruns; each (model, url) pair is built once
+@st.cache_resource
+def _get_embeddings(model: str, base_url: str) -> BatchedOllamaEmbeddings:
+    return BatchedOllamaEmbeddings(
+        model=model,
+        base_url=base_url,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        max_concurrency=EMBEDDING_MAX_CONCURRENCY
+    )
+
+# One splitter per (settings, process); workers reuse it across documents
+@lru_cache(maxsize=None)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int, separators: Tuple[str, ...]) -> RecursiveCharacterTextSplitter:
+    # Literal separators, dropped from chunks: no per-call regex escaping or lookaround patterns
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=list(separators),
+        keep_separator=False,
+        is_separator_regex=False,
+        length_function=len
+    )
+
+# Chunks that arrive already split (e.g. processed PDFs) are indexed as-is.
+# Underscored metadata (the processor's cache bookkeeping) stays out of the docstore.
+def _prepared_chunks(chunks: Optional[List[Document]]) -> List[Document]:
+    return [
+        Document(page_content=chunk.page_content, metadata={k: v for k, v in chunk.metadata.items() if not k.startswith("_")})
+        for chunk in chunks or []
+        if chunk.page_content
+    ]
+
+# Module-level so process pool workers can pickle it
+def _split_one(doc: Document, chunk_size: int, chunk_overlap: int, separators: Tuple[str, ...]) -> List[Document]:
+    return _get_text_splitter(chunk_size, chunk_overlap, separators).split_documents([doc])
+
 class VectorStoreService:
     """
     Vector store service class for managing document vector storage
     """
     # 1. Initialize vector store service
-    def __init__(self, index_dir: str = "faiss_index"):
+    def __init__(self, index_dir: str = "faiss_index", embedding_model: str = EMBEDDING_MODEL):
         """
         index_dir - Index directory
+        embedding_model - Embedding model; fixed for the service, since the index only matches the model that built it
         """
         self.index_dir = Path(index_dir)
-        self.index_dir.mkdir(exist_ok=True)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
         self.vector_store = None
-        self.embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=EMBEDDING_BASE_URL)
+        # 1-bit codes of the chunk vectors (first-stage search); the rerank reads the quantized FAISS index
+        self.binary_index: Optional[faiss.IndexBinaryFlat] = None
+        # Number of vectors the current index was trained on; appends past FAISS_RETRAIN_GROWTH times this rebuild it
+        self._trained_on = 0
+        # Set when the FAISS index is memory-mapped from disk (read-only for IVF indexes)
+        self._index_mmapped = False
+        # Index files are written on a single background thread so saves never block the UI
+        self._save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faiss-save")
+        self._pending_save: Optional[Future] = None
+        atexit.register(self.flush_saves)
+        self.embeddings = _get_embeddings(embedding_model, EMBEDDING_BASE_URL)
         # Initialize text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=SEPARATORS
-        )
+        self.text_splitter = _get_text_splitter(CHUNK_SIZE, CHUNK_OVERLAP, tuple(SEPARATORS))
     
-    # 2. Update embedding model
-    def update_embedding_model(self, model_name: str) -> bool:
-        """
-        model_name - New embedding model name
-
-        @return Whether update succeeded
-        """
-        try:
-            if self.embeddings.model != model_name:
-                self.embeddings = OllamaEmbeddings(model=model_name, base_url=EMBEDDING_BASE_URL)
-                logger.info(f"Embedding model updated to: {model_name}")
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"Failed to update embedding model: {str(e)}")
-            return False
-    
-    # 3. Text splitting method
+    # 2. Text splitting method
     @error_handler()
     def split_documents(self, documents: List[Document]) -> List[Document]:
         """
@@ -72,38 +121,199 @@ class VectorStoreService:
         @return Chunked document list
         """
         try:
-            # Use text splitter for chunking
-            split_docs = self.text_splitter.split_documents(documents)
+            if len(documents) >= PARALLEL_SPLIT_MIN_DOCS:
+                # Splitting is CPU-bound pure Python; fan documents out across processes
+                split_one = partial(_split_one, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=tuple(SEPARATORS))
+                with ProcessPoolExecutor() as executor:
+                    split_docs = [chunk for chunks in executor.map(split_one, documents) for chunk in chunks]
+            else:
+                # Use text splitter for chunking
+                split_docs = self.text_splitter.split_documents(documents)
             logger.info(f"Document splitting complete: original count {len(documents)}, chunked count {len(split_docs)}")
             return split_docs
         except Exception as e:
+            # Unsplit documents would be indexed as oversized chunks; fail instead
             logger.error(f"Document splitting failed: {str(e)}")
-            # If splitting fails, return original documents
-            return documents
+            raise
+
+    # 3. Build an empty, trained FAISS index sized for the given embeddings
+    def _build_index(self, vectors: np.ndarray) -> faiss.Index:
+        """
+        vectors - L2-normalized chunk embeddings, shape (N, d)
+
+        @return Trained inner-product FAISS index (no vectors added yet)
+        """
+        n, d = vectors.shape
+        if n < FAISS_IVFPQ_MIN_VECTORS or d % FAISS_PQ_M != 0:
+            # Small corpora: exhaustive scan over int8 codes. Training records the
+            # per-dimension min/range, which is stored inside index.faiss, and the
+            # distance kernels use SIMD int8 decoding on AVX2/NEON builds.
+            index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            logger.info(f"Trained int8 scalar-quantized index for {n} vectors of dimension {d}")
+            return index
+
+        # k-means needs roughly 39 training points per centroid
+        nlist = FAISS_IVF_NLIST or int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n // 39))
+        quantizer = faiss.IndexFlatIP(d)
+        index = faiss.IndexIVFPQ(quantizer, d, nlist, FAISS_PQ_M, FAISS_PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+
+        # Train on a sample; faiss caps k-means at 256 points per centroid anyway
+        sample_size = min(n, nlist * 256)
+        sample = vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)]
+        index.train(sample)
+        logger.info(f"Trained IVFPQ index: nlist={nlist}, M={FAISS_PQ_M}, nbits={FAISS_PQ_NBITS}")
+        return index
+
+    # 4. Embed chunks into an L2-normalized float32 matrix
+    def _embed_chunks(self, split_docs: List[Document]) -> np.ndarray:
+        """
+        split_docs - Chunked documents
+
+        @return Unit-length embeddings, shape (len(split_docs), d)
+        """
+        texts = [doc.page_content for doc in split_docs]
+        vectors = np.ascontiguousarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        # Normalize once at index time so inner product equals cosine similarity
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    # 5. Add embedded chunks to the vector store and the binary index
+    def _index_chunks(self, split_docs: List[Document], vectors: np.ndarray, ids: Optional[List[str]] = None):
+        """
+        split_docs - Chunked documents
+        vectors - Their embeddings from _embed_chunks
+        ids - Docstore ids to keep (index rebuilds); new ids are generated when omitted
+        """
+        # The background save may still be reading this index and docstore
+        self.flush_saves()
+        if self._index_mmapped:
+            # Memory-mapped inverted lists are read-only; load a writable copy before appending
+            self.vector_store.index = faiss.read_index(str(self.index_dir / "index.faiss"))
+            self._index_mmapped = False
+
+        # Only extend the binary index if it still mirrors the FAISS index row for row
+        track_binary = self._binary_in_sync()
+        self.vector_store.add_embeddings(
+            zip((doc.page_content for doc in split_docs), vectors),
+            metadatas=[doc.metadata for doc in split_docs],
+            ids=ids
+        )
+        if track_binary:
+            self._index_binary_vectors(vectors)
+
+    # 6. Append vectors to the binary index (sign bit per dimension)
+    def _index_binary_vectors(self, vectors: np.ndarray):
+        """
+        vectors - Embeddings to encode; only their packed sign bits are kept
+        """
+        codes = np.packbits(vectors > 0, axis=1)
+        if self.binary_index is None:
+            self.binary_index = faiss.IndexBinaryFlat(codes.shape[1] * 8)
+        self.binary_index.add(codes)
+
+    # 7. Decode stored vectors from the quantized FAISS index (int8 or PQ codes), leaving the rest on disk
+    def _reconstruct(self, ids: np.ndarray) -> np.ndarray:
+        """
+        ids - Positions in the FAISS index
+
+        @return Decoded vectors, shape (len(ids), d)
+        """
+        index = self.vector_store.index
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            # IVF codes are stored per inverted list; map ids to their list slots once
+            ivf.make_direct_map()
+        return index.reconstruct_batch(np.ascontiguousarray(ids, dtype=np.int64))
+
+    # 8. Rebuild the binary codes block by block from the FAISS index (indexes saved without them)
+    def _rebuild_binary_index(self, block_size: int = 65536):
+        self.binary_index = None
+        total = self.vector_store.index.ntotal
+        for start in range(0, total, block_size):
+            self._index_binary_vectors(self._reconstruct(np.arange(start, min(start + block_size, total))))
+
+    # 9. Whether the binary index covers exactly the vectors in the FAISS index
+    def _binary_in_sync(self) -> bool:
+        binary_total = self.binary_index.ntotal if self.binary_index is not None else 0
+        return BINARY_SEARCH_ENABLED and binary_total == self.vector_store.index.ntotal
+
+    # 10. Replace the vector store with a freshly trained index holding exactly these chunks
+    def _new_vector_store(self, split_docs: List[Document], vectors: np.ndarray, ids: Optional[List[str]] = None):
+        """
+        split_docs - Chunked documents
+        vectors - Their embeddings; the index is trained on all of them
+        ids - Docstore ids to keep, see _index_chunks
+        """
+        # The background save may still be reading the index being replaced
+        self.flush_saves()
+        # Wrap the raw index in LangChain's FAISS vector store
+        self.vector_store = FAISS(
+            embedding_function=self.embeddings,
+            index=self._build_index(vectors),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        self._trained_on = len(vectors)
+        self.binary_index = None
+        self._index_mmapped = False
+        self._index_chunks(split_docs, vectors, ids)
+
+    # 11. Whether appending this many vectors should retrain the index instead
+    def _needs_rebuild(self, num_new: int) -> bool:
+        """
+        The index type and its quantizer are fixed by the batch it was trained on, so a small
+        first upload would otherwise keep a poorly trained int8 index and never move to IVF-PQ.
+        """
+        index = self.vector_store.index
+        total = index.ntotal + num_new
+        wants_ivf = total >= FAISS_IVFPQ_MIN_VECTORS and index.d % FAISS_PQ_M == 0
+        is_ivf = faiss.try_extract_index_ivf(index) is not None
+        return wants_ivf != is_ivf or total >= FAISS_RETRAIN_GROWTH * max(self._trained_on, 1)
+
+    # 12. Retrain the index on the whole corpus plus the new chunks, keeping docstore ids
+    def _rebuild_vector_store(self, split_docs: List[Document], vectors: np.ndarray):
+        """
+        split_docs - New chunked documents
+        vectors - Their embeddings
+        """
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        old_ids = [index_to_docstore_id[i] for i in range(self.vector_store.index.ntotal)]
+        old_docs = [self.vector_store.docstore.search(doc_id) for doc_id in old_ids]
+        logger.info(f"Retraining index on {len(old_docs) + len(split_docs)} chunks (previously trained on {self._trained_on})")
+        # Stored vectors are quantized (and clipped to the old training range), so stored chunks are re-embedded.
+        # Geometric growth keeps the total re-embedding work proportional to the corpus size.
+        old_vectors = self._embed_chunks(old_docs)
+        self._new_vector_store(
+            old_docs + split_docs,
+            np.vstack([old_vectors, vectors]),
+            old_ids + [str(uuid.uuid4()) for _ in split_docs]
+        )
 
-    # 4. Create a brand new vector store instance (overwrites existing data)
+    # 13. Create a brand new vector store instance (overwrites existing data)
     @error_handler()
-    def create_vector_store(self, documents: List[Document]) -> Optional[FAISS]:
+    def create_vector_store(self, documents: List[Document], chunks: Optional[List[Document]] = None) -> Optional[FAISS]:
         """
         documents - Document list
+        chunks - Already split chunks, indexed without splitting again
 
         @return FAISS vector store
         """
-        if not documents:
+        chunks = _prepared_chunks(chunks)
+        if not documents and not chunks:
             logger.warning("No documents available to create vector store")
             return None
         
-        logger.info(f"Creating vector store, original document count: {len(documents)}")
+        logger.info(f"Creating vector store, original document count: {len(documents)}, pre-split chunks: {len(chunks)}")
         
         try:
             # Chunk documents
-            split_documents = self.split_documents(documents)
+            split_documents = (self.split_documents(documents) if documents else []) + chunks
             
-            # Use LangChain's FAISS vector store
-            self.vector_store = FAISS.from_documents(
-                split_documents,
-                self.embeddings
-            )
+            # Embed all chunks up front so the index can be trained on them
+            self._new_vector_store(split_documents, self._embed_chunks(split_documents))
             
             # Save vector store
             self._save_vector_store(self.vector_store)
@@ -115,30 +325,81 @@ class VectorStoreService:
             logger.error(f"Failed to create vector store: {str(e)}")
             return None
     
-    # 5. Save vector store
+    # 14. Save vector store in the background
     def _save_vector_store(self, vector_store: FAISS):
         """
         vector_store - FAISS vector store
         """
+        # Serialize writes: at most one save is in flight
+        self.flush_saves()
+        binary_index = self.binary_index if self._binary_in_sync() else None
+        self._pending_save = self._save_executor.submit(self._write_vector_store, vector_store, binary_index, self._trained_on)
+
+    # 15. Write vector store files (runs on the save thread)
+    def _write_vector_store(self, vector_store: FAISS, binary_index: Optional[faiss.IndexBinaryFlat], trained_on: int):
+        """
+        vector_store - FAISS vector store
+        binary_index - Binary codes mirroring the index, if in sync; nothing mutates either until flush_saves
+        trained_on - Training set size of the index
+        """
         try:
             vector_store.save_local(str(self.index_dir))
+            with open(self.index_dir / "index_meta.json", "w") as f:
+                json.dump({"trained_on": trained_on}, f)
+            if binary_index is not None:
+                faiss.write_index_binary(binary_index, str(self.index_dir / "binary.faiss"))
             logger.info(f"Vector store saved to: {self.index_dir}")
         except Exception as e:
             logger.error(f"Failed to save vector store: {str(e)}")
+
+    # 16. Wait for the pending background save, if any
+    def flush_saves(self):
+        """
+        Called before the index is mutated, reloaded or deleted, and at interpreter exit
+        """
+        if self._pending_save is not None:
+            self._pending_save.result()
+            self._pending_save = None
     
-    # 6. Load vector store
+    # 17. Load vector store
     @error_handler()
     def load_vector_store(self) -> Optional[FAISS]:
         """
         @return FAISS vector store
         """
         try:
+            # Don't read files a background save is still writing
+            self.flush_saves()
             if (self.index_dir / "index.faiss").exists():
-                self.vector_store = FAISS.load_local(
-                    str(self.index_dir),
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
+                # Memory-map the index so the OS pages in only the lists/codes a search touches
+                index = faiss.read_index(str(self.index_dir / "index.faiss"), faiss.IO_FLAG_MMAP)
+                # Same docstore pickle that FAISS.save_local writes (trusted local file)
+                with open(self.index_dir / "index.pkl", "rb") as f:
+                    docstore, index_to_docstore_id = pickle.load(f)
+                self.vector_store = FAISS(
+                    embedding_function=self.embeddings,
+                    index=index,
+                    docstore=docstore,
+                    index_to_docstore_id=index_to_docstore_id,
+                    distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
                 )
+                self._index_mmapped = True
+                meta_path = self.index_dir / "index_meta.json"
+                if meta_path.exists():
+                    with open(meta_path) as f:
+                        self._trained_on = json.load(f)["trained_on"]
+                else:
+                    # Saved before training sizes were recorded; assume the index was trained on what it holds
+                    self._trained_on = index.ntotal
+                if self.vector_store.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                    logger.warning("Vector store was built with L2 distance; reprocess documents so similarity thresholds apply")
+                self.binary_index = None
+                if BINARY_SEARCH_ENABLED:
+                    binary_path = self.index_dir / "binary.faiss"
+                    if binary_path.exists():
+                        self.binary_index = faiss.read_index_binary(str(binary_path))
+                    if not self._binary_in_sync():
+                        self._rebuild_binary_index()
                 logger.info("Vector store loaded successfully")
                 return self.vector_store
             logger.warning("Vector store files do not exist")
@@ -147,7 +408,31 @@ class VectorStoreService:
         return None
     
 
-    # 7. Search related documents
+    # 18. Binary first-stage search, reranked against the quantized index
+    def _binary_search(self, query_vector: np.ndarray, k: int) -> List[Tuple[Document, float]]:
+        """
+        query_vector - L2-normalized query embedding, shape (d,)
+        k - Number of results to return
+
+        @return (document, cosine similarity) pairs, best first
+        """
+        # Hamming search over packed sign bits, oversampled to recover recall
+        query_codes = np.packbits(query_vector > 0)[np.newaxis, :]
+        num_candidates = min(k * BINARY_OVERSAMPLE, self.binary_index.ntotal)
+        _, candidate_ids = self.binary_index.search(query_codes, num_candidates)
+        candidates = candidate_ids[0][candidate_ids[0] >= 0]
+
+        # Rerank only the candidates, decoded from the (memory-mapped) quantized index; stored vectors are unit length
+        scores = self._reconstruct(candidates) @ query_vector
+        top = np.argsort(-scores)[:k]
+
+        docstore_ids = self.vector_store.index_to_docstore_id
+        return [
+            (self.vector_store.docstore.search(docstore_ids[int(candidates[i])]), float(scores[i]))
+            for i in top
+        ]
+
+    # 19. Search related documents
     @error_handler()
     def search_documents(self, query: str, threshold: float = 0.7) -> List[Document]:
         """
@@ -163,14 +448,27 @@ class VectorStoreService:
                 return []
         
         try:
-            # Use LangChain similarity search
-            docs_and_scores = self.vector_store.similarity_search_with_score(
-                query,
-                k=MAX_RETRIEVED_DOCS
-            )
+            # Only the query needs normalizing; corpus vectors were normalized at index time
+            query_vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+            faiss.normalize_L2(query_vector)
+
+            if self.binary_index is not None and self._binary_in_sync():
+                docs_and_scores = self._binary_search(query_vector[0], MAX_RETRIEVED_DOCS)
+            else:
+                # IVF indexes only scan `nprobe` of their inverted lists per query
+                ivf = faiss.try_extract_index_ivf(self.vector_store.index)
+                if ivf is not None:
+                    ivf.nprobe = FAISS_IVF_NPROBE or max(1, ivf.nlist // 16)
+
+                # Use LangChain similarity search; scores are inner products (cosine)
+                docs_and_scores = self.vector_store.similarity_search_with_score_by_vector(
+                    query_vector[0].tolist(),
+                    k=MAX_RETRIEVED_DOCS
+                )
             
-            # Filter results by threshold
-            results = [doc for doc, score in docs_and_scores if score > threshold]
+            # Filter results by threshold (higher cosine means more similar) with one vectorized compare
+            scores = np.fromiter((score for _, score in docs_and_scores), dtype=np.float32, count=len(docs_and_scores))
+            results = [docs_and_scores[i][0] for i in np.flatnonzero(scores > threshold)]
             
             logger.info(f"Found {len(results)} related documents, similarity threshold: {threshold}")
             return results
@@ -179,7 +477,7 @@ class VectorStoreService:
             logger.error(f"Failed to search documents: {str(e)}")
             return []
     
-    # 8. Get document context
+    # 20. Get document context
     def get_context(self, docs: List[Document]) -> str:
         """
         docs - Document list
@@ -190,9 +488,21 @@ class VectorStoreService:
             return ""
         return "\n\n".join(doc.page_content for doc in docs)
     
+    # 21. Look up stored chunks by docstore id
+    def get_documents(self, ids: List[str]) -> List[Document]:
+        """
+        ids - Docstore ids, as recorded in chat history
 
-    # 9. Add a single document to vector store (append without rebuilding entire store)
-    @error_handler()
+        @return Chunks still present in the store; ids removed by clear_index are skipped
+        """
+        if not self.vector_store:
+            self.vector_store = self.load_vector_store()
+            if not self.vector_store:
+                return []
+        return self.vector_store.get_by_ids(ids)
+    
+
+    # 22. Add a single document to vector store (append without rebuilding entire store)
     def add_document(self, content: str, metadata: Dict[str, Any] = None) -> bool:
         """
         Add a single document to the vector store
@@ -201,45 +511,69 @@ class VectorStoreService:
         @param {Dict[str, Any]} metadata - Document metadata
         @return {bool} Whether addition succeeded
         """
-        if not content:
+        return self.add_documents([(content, metadata)])
+    
+
+    # 23. Add a batch of documents with one split, one embedding pass and one save
+    @error_handler()
+    def add_documents(self, items: List[Tuple[str, Dict[str, Any]]], chunks: Optional[List[Document]] = None) -> bool:
+        """
+        Add several documents to the vector store at once
+
+        @param {List[Tuple[str, Dict[str, Any]]]} items - (content, metadata) pairs, split before indexing
+        @param {Optional[List[Document]]} chunks - Already split chunks (e.g. processed PDFs), indexed as-is
+        @return {bool} Whether addition succeeded
+        """
+        documents = [
+            Document(page_content=content, metadata=metadata or {})
+            for content, metadata in items
+            if content
+        ]
+        chunks = _prepared_chunks(chunks)
+        if not documents and not chunks:
             logger.warning("Document content is empty; cannot add")
             return False
             
         try:
-            # Create Document object
-            doc = Document(page_content=content, metadata=metadata or {})
-            
-            # Chunk the document
-            split_docs = self.split_documents([doc])
-            
             # If vector store doesn't exist, try loading
             if not self.vector_store:
                 self.vector_store = self.load_vector_store()
                 if not self.vector_store:
-                    # If still not present, create a new vector store with this document
-                    self.vector_store = self.create_vector_store([doc])
-                    return True
+                    # If still not present, create a new vector store with these documents
+                    self.vector_store = self.create_vector_store(documents, chunks)
+                    return self.vector_store is not None
             
-            # Add chunks to existing vector store
-            self.vector_store.add_documents(split_docs)
+            # Chunk and embed the whole batch, then append it to the existing vector store
+            split_docs = (self.split_documents(documents) if documents else []) + chunks
+            vectors = self._embed_chunks(split_docs)
+            if self._needs_rebuild(len(split_docs)):
+                # The corpus outgrew the index's training set (or crossed into IVF-PQ territory)
+                self._rebuild_vector_store(split_docs, vectors)
+            else:
+                self._index_chunks(split_docs, vectors)
             
-            # Save updated vector store
+            # Save updated vector store once for the whole batch
             self._save_vector_store(self.vector_store)
             
-            logger.info(f"Successfully added document, title: {metadata.get('source', 'unknown') if metadata else 'unknown'}, chunks: {len(split_docs)}")
+            logger.info(f"Successfully added {len(documents)} documents and {len(chunks)} pre-split chunks, chunks: {len(split_docs)}")
             return True
             
         except Exception as e:
-            logger.error(f"Failed to add document: {str(e)}")
+            logger.error(f"Failed to add documents: {str(e)}")
             return False
     
 
-    # 10. Clear index (delete all index files)
+    # 24. Clear index (delete all index files)
     def clear_index(self):
         try:
+            self.flush_saves()
+            # Drop references first so memory-mapped files are released before deletion
+            self.vector_store = None
+            self.binary_index = None
+            self._trained_on = 0
+            self._index_mmapped = False
             for file in self.index_dir.glob("*"):
                 file.unlink()
-            self.vector_store = None
             logger.info("Index cleared")
         except Exception as e:
             logger.error(f"Failed to clear index: {str(e)}")
@@ -0,0 +1,48 @@
+"""
+Tests for chat history export
+"""
+import csv
+import io
+
+from langchain_core.documents import Document
+
+from Agentic_RAG.utils import chat_history
+from Agentic_RAG.utils.chat_history import ChatHistoryManager
+
+
+class _FakeVectorStore:
+    """Minimal stand-in exposing the get_documents lookup used by the export"""
+    def __init__(self, docs):
+        self.docs = docs
+
+    def get_documents(self, ids):
+        return [self.docs[doc_id] for doc_id in ids if doc_id in self.docs]
+
+
+def _export_rows(manager, vector_store=None):
+    data = manager.export_to_csv(vector_store)
+    return list(csv.DictReader(io.StringIO(data.decode('utf-8'))))
+
+
+def test_export_joins_retrieved_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_history, "HISTORY_FILE", str(tmp_path / "history.jsonl"))
+    manager = ChatHistoryManager()
+    manager.add_message("user", "question")
+    manager.add_retrieved_docs(["a", "b"])
+
+    store = _FakeVectorStore({"a": Document(page_content="first chunk"),
+                              "b": Document(page_content="second chunk")})
+    rows = _export_rows(manager, store)
+
+    assert rows[0] == {"role": "user", "content": "question"}
+    assert rows[1] == {"role": "retrieved_doc", "content": "first chunk\n---\nsecond chunk"}
+
+
+def test_export_falls_back_to_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_history, "HISTORY_FILE", str(tmp_path / "history.jsonl"))
+    manager = ChatHistoryManager()
+    manager.add_retrieved_docs(["a", "b"])
+
+    rows = _export_rows(manager)
+
+    assert rows[0]["content"] == "a\n---\nb"
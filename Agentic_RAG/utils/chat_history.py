@@ -1,10 +1,11 @@
 """
 Chat history management module
 """
-import json
+import csv
+import io
 import os
+import orjson
 from typing import List, Dict, Optional
-import pandas as pd
 from Agentic_RAG.config.settings import HISTORY_FILE, MAX_HISTORY_TURNS
 
 class ChatHistoryManager:
@@ -14,6 +15,9 @@ class ChatHistoryManager:
     def __init__(self):
         """Initialize chat history manager"""
         self.history: List[Dict] = self.load_history()
+        # Last get_formatted_history result; reset whenever history changes
+        self._formatted_cache: Optional[str] = None
+        self._formatted_cache_turns: int = -1
     
     # 1. Load chat history from file
     def load_history(self) -> List[Dict]:
@@ -23,17 +27,22 @@ class ChatHistoryManager:
         """
         try:
             if os.path.exists(HISTORY_FILE):
-                with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with open(HISTORY_FILE, 'rb') as f:
+                    return [orjson.loads(line) for line in f if line.strip()]
         except Exception as e:
             print(f"Error loading chat history: {str(e)}")
         return []
     
-    # 2. Save chat history to file
-    def save_history(self) -> None:
+    # 2. Append a single message to the history file
+    def append_to_file(self, message: Dict) -> None:
+        """
+        Args:
+            message (Dict): Message record to persist
+        """
         try:
-            with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
+            with open(HISTORY_FILE, 'ab') as f:
+                # orjson emits compact UTF-8 bytes directly
+                f.write(orjson.dumps(message) + b'\n')
         except Exception as e:
             print(f"Error saving chat history: {str(e)}")
     
@@ -44,16 +53,30 @@ class ChatHistoryManager:
             role (str): Message role ('user' or 'assistant')
             content (str): Message content
         """
-        self.history.append({"role": role, "content": content})
-        self.save_history()
+        message = {"role": role, "content": content}
+        self.history.append(message)
+        self._formatted_cache = None
+        self.append_to_file(message)
+    
+    # 4. Add retrieved document references to history
+    def add_retrieved_docs(self, doc_ids: List[str]) -> None:
+        """
+        Args:
+            doc_ids (List[str]): Docstore ids of the retrieved chunks; text is looked up on display
+        """
+        message = {"role": "retrieved_doc", "ids": doc_ids}
+        self.history.append(message)
+        self._formatted_cache = None
+        self.append_to_file(message)
     
-    # 4. Clear chat history
+    # 5. Clear chat history
     def clear_history(self) -> None:
         self.history = []
+        self._formatted_cache = None
         if os.path.exists(HISTORY_FILE):
             os.remove(HISTORY_FILE)
     
-    # 5. Get formatted chat history
+    # 6. Get formatted chat history
     def get_formatted_history(self, max_turns: int = MAX_HISTORY_TURNS) -> str:
         """
         Args:
@@ -64,32 +87,49 @@ class ChatHistoryManager:
         """
         if not self.history:
             return ""
+        if self._formatted_cache is not None and self._formatted_cache_turns == max_turns:
+            return self._formatted_cache
         
         recent_history = self.history[-max_turns*2:] if len(self.history) > max_turns*2 else self.history
         
-        formatted_history = "Previous conversation history:\n"
-        for msg in recent_history:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            formatted_history += f"{role}: {msg['content']}\n"
-        
-        return formatted_history
+        lines = [
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}\n"
+            for msg in recent_history
+            if 'content' in msg
+        ]
+        self._formatted_cache = "Previous conversation history:\n" + "".join(lines)
+        self._formatted_cache_turns = max_turns
+        return self._formatted_cache
     
-    # 6. Export chat history to CSV file
-    def export_to_csv(self) -> Optional[bytes]:
+    # 7. Export chat history to CSV file
+    def export_to_csv(self, vector_store=None) -> Optional[bytes]:
         """
         Export chat history to CSV
 
+        Args:
+            vector_store: Vector store service used to restore the text of retrieved chunks;
+                without it (or for chunks no longer stored) their ids are written instead
+
         Returns:
             Optional[bytes]: CSV content; None if export fails
         """
         try:
-            df = pd.DataFrame(self.history)
-            return df.to_csv(index=False).encode('utf-8')
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=["role", "content"], extrasaction="ignore")
+            writer.writeheader()
+            for message in self.history:
+                if 'ids' in message:
+                    # Retrieved chunks are stored by reference; rehydrate their text like the chat view does
+                    docs = vector_store.get_documents(message['ids']) if vector_store else []
+                    contents = [doc.page_content for doc in docs] if docs else message['ids']
+                    message = {"role": message['role'], "content": "\n---\n".join(contents)}
+                writer.writerow(message)
+            return buffer.getvalue().encode('utf-8')
         except Exception as e:
             print(f"Error exporting chat history: {str(e)}")
             return None
     
-    # 7. Get chat history statistics
+    # 8. Get chat history statistics
     def get_stats(self) -> Dict[str, int]:
         """
         Get statistics for chat history
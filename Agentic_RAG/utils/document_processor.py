@@ -1,29 +1,37 @@
 """
 Document processing module
 """
-import os
-import hashlib
-import json
-from typing import List, Optional, Dict, Any, Union
+import sqlite3
+from contextlib import closing
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Union, Tuple
 import logging
 from pathlib import Path
 import io
-import tempfile
+
+import pymupdf
+import orjson
+import xxhash
 
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from semantic_text_splitter import TextSplitter
 
 from Agentic_RAG.utils.decorators import error_handler, log_execution
 from datetime import datetime
-from Agentic_RAG.config.settings import CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS
+from Agentic_RAG.config.settings import CHUNK_SIZE, CHUNK_OVERLAP
 
-from langchain_community.document_loaders import PyPDFLoader
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Splitter settings are fixed for the process, so every DocumentProcessor shares one splitter
+@lru_cache(maxsize=8)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int) -> TextSplitter:
+    # Character-based capacity, matching CHUNK_SIZE/CHUNK_OVERLAP used elsewhere
+    return TextSplitter(chunk_size, overlap=chunk_overlap)
+
 class DocumentProcessor:
     """
     Document processor class for handling PDF documents
@@ -38,58 +46,130 @@ class DocumentProcessor:
         self.cache_dir = Path(cache_dir)
         print(f"Cache directory set to: {self.cache_dir}")
         self.cache_dir.mkdir(exist_ok=True)
+        # One SQLite database holds every cache entry: a single file instead of one per upload
+        self.db_path = self.cache_dir / "cache.sqlite3"
+        with closing(self._connect()) as conn:
+            # WAL lets parallel upload workers read while another one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Per-file manifests of chunk ids, and content-addressed chunk texts shared by all files
+            conn.execute("CREATE TABLE IF NOT EXISTS cache(key TEXT PRIMARY KEY, blob BLOB)")
+            conn.execute("CREATE TABLE IF NOT EXISTS chunks(id TEXT PRIMARY KEY, content TEXT)")
+            # Extracted page texts, keyed by file content only so they survive splitter changes
+            conn.execute("CREATE TABLE IF NOT EXISTS pages(key TEXT PRIMARY KEY, blob BLOB)")
+            conn.commit()
         self.max_workers = max_workers
-        
-        # Initialize text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=SEPARATORS,
-            length_function=len,
-            is_separator_regex=False
-        )
     
-    # 2. Get cache file path
-    def _get_cache_path(self, file_content: bytes, file_name: str) -> Path:
+    # Text splitter; looked up rather than stored because the Rust splitter can't be pickled into worker processes
+    @property
+    def text_splitter(self) -> TextSplitter:
+        return _get_text_splitter(CHUNK_SIZE, CHUNK_OVERLAP)
+    
+    # Open a cache connection; short-lived so the processor stays picklable for worker processes
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        # Durable across app crashes in WAL mode, without an fsync per commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    # 2. Get cache keys
+    def _get_cache_key(self, file_content: bytes, file_name: str) -> Tuple[str, str]:
         """
         file_content - File content
         file_name - File name
 
-        @return Cache file path
+        @return (pages cache key, chunks cache key)
         """
-        cache_key = hashlib.md5(file_content + file_name.encode()).hexdigest()
-        return self.cache_dir / f"{cache_key}.json"
+        # xxh128 is far faster than MD5 on large PDFs; hashing a memoryview avoids copying the content
+        hasher = xxhash.xxh128()
+        hasher.update(memoryview(file_content))
+        pages_key = hasher.hexdigest()
+        # Split chunks also depend on the file name (source metadata) and the splitter settings
+        hasher.update(file_name.encode())
+        hasher.update(f"\0{CHUNK_SIZE}:{CHUNK_OVERLAP}".encode())
+        return pages_key, hasher.hexdigest()
     
     # 3. Load processed result from cache
-    def _load_from_cache(self, cache_path: str) -> Optional[List[Document]]:
+    def _load_from_cache(self, cache_key: str) -> Optional[List[Document]]:
         """
-        @param {str} cache_path - Cache file path
+        @param {str} cache_key - Cache key
         @return {Optional[List[Document]]} Processed result; None if cache doesn't exist
         """
         try:
-            path = Path(cache_path)
-            if path.exists():
-                with open(path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return [Document(**doc) for doc in data]
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT blob FROM cache WHERE key = ?", (cache_key,)).fetchone()
+                if row is None:
+                    return None
+                manifest = orjson.loads(row[0])
+                common_meta = manifest["common_meta"]
+                entries = manifest["chunks"]
+                contents = {}
+                for entry in entries:
+                    chunk_id = entry["chunk_id"]
+                    if chunk_id not in contents:
+                        contents[chunk_id] = conn.execute("SELECT content FROM chunks WHERE id = ?", (chunk_id,)).fetchone()[0]
+            return [
+                Document(
+                    page_content=contents[entry["chunk_id"]],
+                    metadata={**common_meta, **entry["meta"], "_chunk_id": entry["chunk_id"]}
+                )
+                for entry in entries
+            ]
         except Exception as e:
             logger.warning(f"Failed to load from cache: {str(e)}")
         return None
     
     # 4. Save processed result to cache
-    def _save_to_cache(self, cache_path: Path, documents: List[Document]):
+    def _save_to_cache(self, cache_key: str, documents: List[Document]):
         """
-        @param {Path} cache_path - Cache file path
+        @param {str} cache_key - Cache key
         @param {List[Document]} documents - Processed documents
         """
         try:
-            # Convert Document objects to serializable dicts
-            docs_data = [doc.dict() for doc in documents]
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(docs_data, f, ensure_ascii=False, indent=2)
+            # The per-file entry is a manifest of chunk ids; each distinct chunk text is stored once,
+            # so near-duplicate uploads (v1/v2 of a document) share most of their storage
+            # Metadata shared by every chunk (source, total_pages) is written once; chunks keep only the rest
+            common_meta = {k: v for k, v in documents[0].metadata.items() if k != "_chunk_id"}
+            for doc in documents[1:]:
+                common_meta = {k: v for k, v in common_meta.items() if k in doc.metadata and doc.metadata[k] == v}
+            docs_data = {
+                "common_meta": common_meta,
+                "chunks": [
+                    {
+                        "chunk_id": doc.metadata["_chunk_id"],
+                        "meta": {k: v for k, v in doc.metadata.items() if k not in common_meta and k != "_chunk_id"}
+                    }
+                    for doc in documents
+                ]
+            }
+            # One transaction for the whole file
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO chunks(id, content) VALUES (?, ?)",
+                    ((doc.metadata["_chunk_id"], doc.page_content) for doc in documents)
+                )
+                conn.execute("INSERT OR REPLACE INTO cache(key, blob) VALUES (?, ?)", (cache_key, orjson.dumps(docs_data)))
         except Exception as e:
             logger.warning(f"Failed to save to cache: {str(e)}")
     
+    # Load extracted page texts from cache
+    def _load_pages(self, pages_key: str) -> Optional[List[str]]:
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT blob FROM pages WHERE key = ?", (pages_key,)).fetchone()
+            if row is not None:
+                return orjson.loads(row[0])
+        except Exception as e:
+            logger.warning(f"Failed to load pages from cache: {str(e)}")
+        return None
+    
+    # Save extracted page texts to cache
+    def _save_pages(self, pages_key: str, pages: List[str]):
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("INSERT OR REPLACE INTO pages(key, blob) VALUES (?, ?)", (pages_key, orjson.dumps(pages)))
+        except Exception as e:
+            logger.warning(f"Failed to save pages to cache: {str(e)}")
+    
 
     # 5. Process PDF file
     @error_handler()
@@ -102,9 +182,9 @@ class DocumentProcessor:
         @return List of processed documents
         """
         # Check cache
-        cache_path = self._get_cache_path(file_content, file_name)
-        print(f"Cache path: {cache_path}")
-        cached_docs = self._load_from_cache(str(cache_path))
+        pages_key, cache_key = self._get_cache_key(file_content, file_name)
+        print(f"Cache key: {cache_key}")
+        cached_docs = self._load_from_cache(cache_key)
         if cached_docs is not None:
             logger.info(f"Loaded from cache: {file_name}")
             return cached_docs
@@ -113,38 +193,40 @@ class DocumentProcessor:
         logger.info(f"Processing file: {file_name}")
         
         try:
-            # On Windows, NamedTemporaryFile opened with delete=True can't be reopened (permission error).
-            # Use mkstemp to create a closed path we can reopen safely.
-            temp_path = None
-            try:
-                fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-                os.close(fd)  # Close the low-level file descriptor immediately
-                logger.debug(f"Created temporary file: {temp_path}")
-
-                # Write the PDF content
-                with open(temp_path, 'wb') as f:
-                    f.write(file_content)
-
-                # Load PDF via temporary path
-                loader = PyPDFLoader(temp_path)
-                documents = loader.load()
-                logger.debug(f"Loaded documents: {len(documents)}")
-
-                # Split documents using the text splitter
-                split_docs = self.text_splitter.split_documents(documents)
-
-                # Save to cache
-                if split_docs:
-                    self._save_to_cache(cache_path, split_docs)
-
-                return split_docs
-            finally:
-                if temp_path and os.path.exists(temp_path):
-                    try:
-                        os.remove(temp_path)
-                        logger.debug(f"Deleted temporary file: {temp_path}")
-                    except OSError as cleanup_err:
-                        logger.warning(f"Failed to delete temp file {temp_path}: {cleanup_err}")
+            # Extraction doesn't depend on the splitter, so chunk-size changes reuse cached pages
+            pages = self._load_pages(pages_key)
+            if pages is None:
+                # Open the PDF straight from memory; no temporary file round trip
+                with pymupdf.open(stream=file_content, filetype="pdf") as pdf:
+                    pages = [page.get_text() for page in pdf]
+                self._save_pages(pages_key, pages)
+            else:
+                logger.info(f"Loaded pages from cache: {file_name}")
+            documents = [
+                Document(
+                    page_content=text,
+                    metadata={"source": file_name, "page": number, "total_pages": len(pages)}
+                )
+                for number, text in enumerate(pages)
+            ]
+            logger.debug(f"Loaded documents: {len(documents)}")
+
+            # Split all pages in one call; the Rust splitter processes them in parallel
+            chunks_per_page = self.text_splitter.chunk_all([doc.page_content for doc in documents])
+            split_docs = [
+                Document(page_content=chunk, metadata=dict(doc.metadata))
+                for doc, chunks in zip(documents, chunks_per_page)
+                for chunk in chunks
+            ]
+            # Content hash per chunk; chunk boundaries follow the text, so shared passages get the same id
+            for doc in split_docs:
+                doc.metadata["_chunk_id"] = xxhash.xxh128_hexdigest(doc.page_content.encode())
+
+            # Save to cache
+            if split_docs:
+                self._save_to_cache(cache_key, split_docs)
+
+            return split_docs
                 
         except Exception as e:
             logger.error(f"Failed to process PDF file: {str(e)}")
@@ -154,8 +236,10 @@ class DocumentProcessor:
     # 6. Clear all cache
     def clear_cache(self):
         try:
-            for file in self.cache_dir.glob("*.json"):
-                file.unlink()
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM cache")
+                conn.execute("DELETE FROM chunks")
+                conn.execute("DELETE FROM pages")
             logger.info("Cache cleared")
         except Exception as e:
             logger.error(f"Failed to clear cache: {str(e)}")
@@ -2,11 +2,13 @@
 UI components module containing all Streamlit UI rendering logic
 """
 import streamlit as st
-import pandas as pd
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Tuple, List, Any
+from typing import Tuple, List, Any, Union
 import logging
 
+import xxhash
+
 from langchain_core.documents import Document
 
 from Agentic_RAG.utils.document_processor import DocumentProcessor
@@ -16,9 +18,22 @@ from Agentic_RAG.config.settings import AVAILABLE_EMBEDDING_MODELS
 
 logger = logging.getLogger(__name__)
 
+# Processed uploads are memoized in memory by content, so re-uploads skip parsing and the disk cache.
+# Underscored arguments are not part of the cache key.
+@st.cache_data(hash_funcs={bytes: xxhash.xxh128_digest}, max_entries=32, show_spinner=False)
+def _process_upload(
+    file_content: bytes,
+    file_name: str,
+    _document_processor: DocumentProcessor,
+    _executor: Executor
+) -> Union[str, List[Document]]:
+    return _executor.submit(_document_processor.process_file, file_content, file_name).result()
+
 class UIComponents:
     """UI components class that encapsulates all Streamlit UI rendering logic"""
     
+    # Sidebar components (1-3) render into the current container; call them inside `with st.sidebar:`
+
     # 1. Render model selection components
     @staticmethod
     def render_model_selection(available_models: List[str], current_model: str, embedding_models: List[str], current_embedding_model: str) -> Tuple[str, str]:
@@ -30,16 +45,16 @@ class UIComponents:
 
         @return (user selected model, user selected embedding model)
         """
-        st.sidebar.header("⚙️ Settings")
+        st.header("⚙️ Settings")
         
-        new_model = st.sidebar.selectbox(
+        new_model = st.selectbox(
             "Choose model",
             options=available_models,
             index=available_models.index(current_model) if current_model in available_models else 0,
             help="Select the language model to use"
         )
         
-        new_embedding_model = st.sidebar.selectbox(
+        new_embedding_model = st.selectbox(
             "Embedding model",
             options=embedding_models,
             index=embedding_models.index(current_embedding_model) if current_embedding_model in embedding_models else 0,
@@ -59,15 +74,15 @@ class UIComponents:
 
         @return (whether RAG is enabled, similarity threshold)
         """
-        st.sidebar.subheader("RAG Settings")
+        st.subheader("RAG Settings")
         
-        new_rag_enabled = st.sidebar.checkbox(
+        new_rag_enabled = st.checkbox(
             "Enable RAG",
             value=rag_enabled,
             help="Enable Retrieval-Augmented Generation using uploaded documents to enhance answers"
         )
         
-        new_similarity_threshold = st.sidebar.slider(
+        new_similarity_threshold = st.slider(
             "Similarity threshold",
             min_value=0.0,
             max_value=1.0,
@@ -77,7 +92,7 @@ class UIComponents:
         )
         
         # Change the reset similarity threshold button to use container width
-        if st.sidebar.button("Reset similarity threshold", use_container_width=True):
+        if st.button("Reset similarity threshold", use_container_width=True):
             new_similarity_threshold = default_threshold
             
         return new_rag_enabled, new_similarity_threshold
@@ -85,18 +100,19 @@ class UIComponents:
 
     # 3. Render chat statistics
     @staticmethod
-    def render_chat_stats(chat_history):
+    def render_chat_stats(chat_history, vector_store: VectorStoreService = None):
         """
         chat_history - Chat history manager
+        vector_store - Vector store service used to restore retrieved chunks in the export
         """
-        st.sidebar.header("💬 Conversation History")
+        st.header("💬 Conversation History")
         stats = chat_history.get_stats()
-        st.sidebar.info(f"Total messages: {stats['total_messages']} User messages: {stats['user_messages']}")
+        st.info(f"Total messages: {stats['total_messages']} User messages: {stats['user_messages']}")
         
-        if st.sidebar.button("📥 Export conversation history", use_container_width=True):
-            csv = chat_history.export_to_csv()
+        if st.button("📥 Export conversation history", use_container_width=True):
+            csv = chat_history.export_to_csv(vector_store)
             if csv:
-                st.sidebar.download_button(
+                st.download_button(
                     label="Download CSV file",
                     data=csv,
                     file_name=f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
@@ -104,7 +120,7 @@ class UIComponents:
                     use_container_width=True
                 )
         
-        if st.sidebar.button("✨ Clear conversation", use_container_width=True):
+        if st.button("✨ Clear conversation", use_container_width=True):
             chat_history.clear_history()
             st.rerun()
 
@@ -134,36 +150,64 @@ class UIComponents:
                 st.warning("⚠️ Please configure the vector store in the sidebar to enable document processing.")
             
             all_docs = []
+            # PDFs come back from the processor already chunked; only plain text still needs splitting
+            pdf_chunks, text_docs = [], []
             if uploaded_files:
                 if st.button("Process documents"):
                     with st.spinner("Processing documents..."):
+                        pending = []
                         for uploaded_file in uploaded_files:
                             if uploaded_file.name not in processed_documents:
-                                try:
-                                    # Handle all file types uniformly
-                                    result = document_processor.process_file(uploaded_file)
-                                    
-                                    if isinstance(result, list):
-                                        # The result is a list of Documents (PDF)
-                                        all_docs.extend(result)
-                                    else:
-                                        # The result is plain text content (TXT, DOCX, etc.)
-                                        doc = Document(
-                                            page_content=result, 
-                                            metadata={"source": uploaded_file.name}
-                                        )
-                                        all_docs.append(doc)
-                                    
-                                    processed_documents.append(uploaded_file.name)
-                                    st.success(f"✅ Processed: {uploaded_file.name}")
-                                except Exception as e:
-                                    st.error(f"❌ Failed to process: {uploaded_file.name} - {str(e)}")
+                                pending.append(uploaded_file)
                             else:
                                 st.warning(f"⚠️ Already exists: {uploaded_file.name}")
+                        
+                        results = {}
+                        if pending:
+                            # PDF parsing and splitting are CPU-bound; cache misses run in parallel worker processes,
+                            # dispatched from threads so memoized files return without waiting on the others
+                            progress = st.progress(0.0)
+                            with ProcessPoolExecutor(max_workers=min(document_processor.max_workers, len(pending))) as processes, \
+                                    ThreadPoolExecutor(max_workers=len(pending)) as threads:
+                                futures = {
+                                    threads.submit(_process_upload, uploaded_file.getvalue(), uploaded_file.name, document_processor, processes): uploaded_file.name
+                                    for uploaded_file in pending
+                                }
+                                for done, future in enumerate(as_completed(futures), 1):
+                                    file_name = futures[future]
+                                    try:
+                                        results[file_name] = future.result()
+                                        st.success(f"✅ Processed: {file_name}")
+                                    except Exception as e:
+                                        st.error(f"❌ Failed to process: {file_name} - {str(e)}")
+                                    progress.progress(done / len(pending))
+                        
+                        # Collect results in upload order
+                        for uploaded_file in pending:
+                            if uploaded_file.name not in results:
+                                continue
+                            result = results[uploaded_file.name]
+                            if isinstance(result, list):
+                                # The result is a list of chunk Documents (PDF)
+                                pdf_chunks.extend(result)
+                            else:
+                                # The result is plain text content (TXT, DOCX, etc.)
+                                doc = Document(
+                                    page_content=result, 
+                                    metadata={"source": uploaded_file.name}
+                                )
+                                text_docs.append(doc)
+                            
+                            processed_documents.append(uploaded_file.name)
                 
+                all_docs = pdf_chunks + text_docs
                 if all_docs:
                     with st.spinner("Building vector index..."):
-                        vector_store.vector_store = vector_store.create_vector_store(all_docs)
+                        # Append the whole upload batch in one embed/save pass; PDF chunks skip re-splitting
+                        vector_store.add_documents(
+                            [(doc.page_content, doc.metadata) for doc in text_docs],
+                            chunks=pdf_chunks
+                        )
             
             # Show the list of processed documents
             if processed_documents:
@@ -183,13 +227,18 @@ class UIComponents:
 
     # 5. Render chat history
     @staticmethod
-    def render_chat_history(chat_history):
+    def render_chat_history(chat_history, vector_store: VectorStoreService = None):
         """
         chat_history - Chat history manager
+        vector_store - Vector store service used to look up retrieved chunks by id
         """
         for message in chat_history.history:
             role = message.get('role', '')
             content = message.get('content', '')
+            if 'ids' in message:
+                # Retrieved chunks are stored by reference; rehydrate their text from the docstore
+                docs = vector_store.get_documents(message['ids']) if vector_store else []
+                content = [doc.page_content for doc in docs]
             
             if role == "assistant_think":
                 with st.expander("💡 View reasoning process <think> ... </think>"):
@@ -199,6 +248,8 @@ class UIComponents:
                     if isinstance(content, list):
                         for idx, doc in enumerate(content, 1):
                             st.markdown(f"**Document chunk {idx}:**\n{doc}")
+                        if len(content) < len(message.get('ids', content)):
+                            st.caption("Some chunks are no longer in the vector store.")
                     else:
                         st.markdown(content)
             else:
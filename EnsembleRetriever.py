@@ -1,24 +1,35 @@
 
-from langchain_community.retrievers.bm25 import BM25Retriever
-from langchain_community.vectorstores import Chroma
+import os
+import json
+
 from langchain_core.runnables import Runnable
-from typing import List, Any
-from collections import defaultdict
+from typing import List, Any, Optional
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+import bm25s
+import faiss
+import numpy as np
+import xxhash
 
 # Custom EnsembleRetriever Implementation
 # (EnsembleRetriever may not be available in some LangChain versions)
 class EnsembleRetriever(Runnable):
     """
     Custom implementation of ensemble retriever.
-    Combines results from multiple retrievers with weighted scores.
+    Combines results from multiple retrievers with weighted Reciprocal Rank Fusion.
     """
-    def __init__(self, retrievers: List[Any], weights: List[float] = None):
+    def __init__(self, retrievers: List[Any], weights: List[float] = None, c: int = 60, max_k: int = 64,
+                 top_k: Optional[int] = None):
         """
         Initialize ensemble retriever.
 
         Args:
             retrievers: List of retriever objects to combine
             weights: List of weights for each retriever (defaults to equal weights)
+            c: RRF constant added to each rank; larger values flatten the gap between top ranks
+            max_k: Ranks to precompute scores for; longer result lists are scored on the fly
+            top_k: Number of fused documents to return (defaults to all)
         """
         super().__init__()
         self.retrievers = retrievers
@@ -30,6 +41,16 @@ class EnsembleRetriever(Runnable):
             raise ValueError(f"Number of weights ({len(weights)}) must match number of retrievers ({len(retrievers)})")
 
         self.weights = weights
+        self.c = c
+        self.top_k = top_k
+
+        # Weights and c are fixed, so each retriever's RRF score by rank is computed once
+        # and sliced per query: weight / (c + rank), with rank starting at 1
+        self._score_tables = [self._rrf_scores(weight, max_k) for weight in weights]
+
+    def _rrf_scores(self, weight: float, num_docs: int) -> np.ndarray:
+        """RRF contributions for ranks 1..num_docs."""
+        return weight / (self.c + np.arange(1, num_docs + 1, dtype=np.float64))
 
     @property
     def InputType(self):
@@ -53,51 +74,175 @@ class EnsembleRetriever(Runnable):
         else:
             query = str(input)
 
-        # Get documents from each retriever
-        all_doc_scores = defaultdict(float)
-        all_docs = {}
-
-        for retriever, weight in zip(self.retrievers, self.weights):
-            # Retrieve documents
-            docs = retriever.invoke(query)
-
-            # Assign scores based on rank (higher rank = higher score)
-            # Documents are typically returned in order of relevance
-            num_docs = len(docs)
-            for rank, doc in enumerate(docs):
-                # Use content hash as unique identifier
-                doc_hash = hash(doc.page_content)
-
-                # Calculate score: (num_docs - rank) / num_docs * weight
-                # This gives higher scores to documents ranked higher
-                if num_docs > 0:
-                    score = ((num_docs - rank) / num_docs) * weight
-                else:
-                    score = weight
+        # Get documents from each retriever concurrently; vector search mostly waits on the
+        # embedding server, so BM25 scoring overlaps it and latency is the slowest retriever
+        if len(self.retrievers) > 1:
+            with ThreadPoolExecutor(max_workers=len(self.retrievers)) as executor:
+                results = list(executor.map(lambda retriever: retriever.invoke(query), self.retrievers))
+        else:
+            results = [retriever.invoke(query) for retriever in self.retrievers]
+
+        # Deduplicate documents in one pass, mapping each retrieved doc to a slot in all_docs
+        all_docs = []
+        doc_index = {}
+        positions = []
+        for docs in results:
+            slots = []
+            for doc in docs:
+                # Use content hash as unique identifier (xxh3 is much faster than SipHash on long chunks)
+                doc_hash = xxhash.xxh3_64_intdigest(doc.page_content.encode())
 
                 # Store document if not seen before
-                if doc_hash not in all_docs:
-                    all_docs[doc_hash] = doc
+                if doc_hash not in doc_index:
+                    doc_index[doc_hash] = len(all_docs)
+                    all_docs.append(doc)
+                slots.append(doc_index[doc_hash])
+            positions.append(np.asarray(slots, dtype=np.intp))
 
-                # Accumulate scores
-                all_doc_scores[doc_hash] += score
+        # Accumulate RRF scores from the precomputed tables
+        # This gives higher scores to documents ranked higher
+        scores = np.zeros(len(all_docs), dtype=np.float64)
+        for slots, table, weight in zip(positions, self._score_tables, self.weights):
+            if len(slots) <= len(table):
+                contrib = table[:len(slots)]
+            else:
+                contrib = self._rrf_scores(weight, len(slots))
+            # add.at handles a retriever returning the same content twice
+            np.add.at(scores, slots, contrib)
 
-        # Sort documents by combined score
-        sorted_docs = sorted(
-            all_docs.items(),
-            key=lambda x: all_doc_scores[x[0]],
-            reverse=True
-        )
+        if self.top_k is not None and self.top_k < len(all_docs):
+            # Only the top_k are consumed downstream: O(N log k) selection instead of a full sort.
+            # nlargest matches a stable sort, so ties keep first-seen order
+            score_list = scores.tolist()
+            order = heapq.nlargest(self.top_k, range(len(score_list)), key=score_list.__getitem__)
+        else:
+            # Sort documents by combined score (stable, so ties keep first-seen order)
+            order = np.argsort(-scores, kind="stable")
 
         # Return documents in order of combined scores
-        return [doc for _, doc in sorted_docs]
+        return [all_docs[i] for i in order]
 
     def get_relevant_documents(self, query: str):
         """Compatibility method for older API."""
         return self.invoke(query)
 
 
-def get_ensemble_retriever(docs, embedding_model, collection_name="test", top_k=3) -> Any:
+class BM25SRetriever:
+    """
+    Keyword retriever backed by bm25s.
+    Scores are precomputed into a sparse matrix at index time, so a query is a few NumPy ops
+    instead of LangChain BM25Retriever's pure-Python scoring.
+    """
+    def __init__(self, docs: List[Any], k: int = 4):
+        """
+        Index documents for BM25 retrieval.
+
+        Args:
+            docs: Documents to index
+            k: Number of documents to return per query
+        """
+        self.docs = docs
+        self.k = k
+        self.retriever = bm25s.BM25()
+        self.retriever.index(bm25s.tokenize([doc.page_content for doc in docs], show_progress=False), show_progress=False)
+
+    @classmethod
+    def from_documents(cls, docs: List[Any], k: int = 4) -> "BM25SRetriever":
+        """Same constructor name as BM25Retriever."""
+        return cls(docs, k=k)
+
+    def invoke(self, input: Any, config: Any = None, **kwargs: Any):
+        """Return the top-k documents for a query string."""
+        # bm25s requires k <= corpus size
+        k = min(self.k, len(self.docs))
+        if k == 0:
+            return []
+        indices, _ = self.retriever.retrieve(bm25s.tokenize([str(input)], show_progress=False), k=k, show_progress=False)
+        return [self.docs[i] for i in indices[0]]
+
+    def get_relevant_documents(self, query: str):
+        """Compatibility method for older API."""
+        return self.invoke(query)
+
+
+class FaissSQRetriever:
+    """
+    Dense retriever over an int8 scalar-quantized FAISS index.
+    Vectors are L2-normalized, so inner product equals cosine similarity. Each dimension is stored
+    as one byte, a quarter of the FP32 footprint, and the exhaustive scan reads 4x less memory.
+    """
+    def __init__(self, docs: List[Any], embedding_model: Any, k: int = 4, index: Optional[faiss.Index] = None):
+        """
+        Embed and index documents.
+
+        Args:
+            docs: Documents to index
+            embedding_model: Embedding model used for documents and queries
+            k: Number of documents to return per query
+            index: Previously built index over the same docs, in the same order
+        """
+        self.docs = docs
+        self.embedding_model = embedding_model
+        self.k = k
+        if index is None:
+            vectors = np.asarray(embedding_model.embed_documents([doc.page_content for doc in docs]), dtype=np.float32)
+            faiss.normalize_L2(vectors)
+            index = faiss.IndexScalarQuantizer(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            # Training only records the per-dimension value ranges used for quantization
+            index.train(vectors)
+            index.add(vectors)
+        self.index = index
+
+    @classmethod
+    def load(cls, path: str, docs: List[Any], embedding_model: Any, k: int = 4) -> "FaissSQRetriever":
+        """Load an index written by save(); docs must be the ones it was built from."""
+        index = faiss.read_index(path)
+        if index.ntotal != len(docs):
+            raise ValueError(f"Index at {path} holds {index.ntotal} vectors, expected {len(docs)}")
+        return cls(docs, embedding_model, k=k, index=index)
+
+    def save(self, path: str):
+        """Write the quantized index to disk."""
+        faiss.write_index(self.index, path)
+
+    def invoke(self, input: Any, config: Any = None, **kwargs: Any):
+        """Return the top-k documents for a query string."""
+        k = min(self.k, self.index.ntotal)
+        if k == 0:
+            return []
+        query = np.asarray([self.embedding_model.embed_query(str(input))], dtype=np.float32)
+        faiss.normalize_L2(query)
+        _, indices = self.index.search(query, k)
+        return [self.docs[i] for i in indices[0] if i >= 0]
+
+    def get_relevant_documents(self, query: str):
+        """Compatibility method for older API."""
+        return self.invoke(query)
+
+
+# Embedder attributes that change the vectors it produces (BGEEmbeddings and LangChain HuggingFace embeddings)
+_ENCODE_SETTINGS = ("model_name", "normalize", "encode_kwargs", "query_encode_kwargs", "model_kwargs",
+                    "query_instruction", "embed_instruction")
+
+
+def _index_cache_dir(docs, embedding_model, collection_name, persist_directory) -> str:
+    """Directory for a persisted index, keyed by chunk contents and embedding settings.
+
+    Any change to the source PDF, the splitter settings, the embedding model or its encode
+    settings (e.g. normalize_embeddings) changes the key, so a stale index is never reused.
+    The key also pins the chunk order, so only the index itself needs to be stored.
+    """
+    hasher = xxhash.xxh128()
+    settings = {name: getattr(embedding_model, name) for name in _ENCODE_SETTINGS if hasattr(embedding_model, name)}
+    settings["class"] = type(embedding_model).__name__
+    hasher.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    for doc in docs:
+        hasher.update(b"\0")
+        hasher.update(doc.page_content.encode())
+    return os.path.join(persist_directory, f"{collection_name}-{hasher.hexdigest()}")
+
+
+def get_ensemble_retriever(docs, embedding_model, collection_name="test", top_k=3, persist_directory=None) -> Any:
     """
     Initializes a retriever object to fetch the top_k most relevant documents based on cosine similarity.
 
@@ -105,6 +250,8 @@ def get_ensemble_retriever(docs, embedding_model, collection_name="test", top_k=
     - docs: A list of documents to be indexed and retrieved.
     - embedding_model: The embedding model to use for generating document embeddings.
     - top_k: The number of top relevant documents to retrieve. Defaults to 3.
+    - persist_directory: (Optional) Directory to persist the dense index in. An index built
+      earlier from the same chunks and embedding model is reused instead of re-embedded.
 
     Returns:
     - A retriever object configured to retrieve the top_k relevant documents.
@@ -119,22 +266,40 @@ def get_ensemble_retriever(docs, embedding_model, collection_name="test", top_k=
         raise ValueError("top_k must be at least 1")
 
     try:
-        vector_store = Chroma.from_documents(
-            docs,
-            embedding_model,
-            collection_name=collection_name,
-        )
+        # Identical chunks (shared boilerplate, or v1/v2 of a document) are indexed and embedded once
+        unique_docs = {}
+        for doc in docs:
+            chunk_id = doc.metadata.get("_chunk_id") or xxhash.xxh128_hexdigest(doc.page_content.encode())
+            unique_docs.setdefault(chunk_id, doc)
+        docs = list(unique_docs.values())
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # add keyword search; the BM25 index is built while the embedding model runs below
+            keyword_future = executor.submit(BM25SRetriever.from_documents, docs)
+
+            if persist_directory is None:
+                retriever = FaissSQRetriever(docs, embedding_model, k=top_k)
+            else:
+                cache_dir = _index_cache_dir(docs, embedding_model, collection_name, persist_directory)
+                index_path = os.path.join(cache_dir, "index.faiss")
+                if os.path.exists(index_path):
+                    retriever = FaissSQRetriever.load(index_path, docs, embedding_model, k=top_k)
+                    print(f"Reusing persisted index '{collection_name}'")
+                else:
+                    retriever = FaissSQRetriever(docs, embedding_model, k=top_k)
+                    os.makedirs(cache_dir, exist_ok=True)
+                    retriever.save(index_path)
+
+            keyword_retriever = keyword_future.result()
 
-        retriever = vector_store.as_retriever(search_kwargs={"k":top_k})
         # retriever.k = top_k
 
-        # add keyword search
-        keyword_retriever = BM25Retriever.from_documents(docs)
         keyword_retriever.k =  3
 
         ensemble_retriever = EnsembleRetriever(retrievers=[retriever,
                                                     keyword_retriever],
-                                        weights=[0.5, 0.5])
+                                        weights=[0.5, 0.5],
+                                        top_k=top_k)
 
         return ensemble_retriever
     except Exception as e:
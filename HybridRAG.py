@@ -45,7 +45,8 @@ if __name__ == '__main__':
     # ============================================
 
     print('Now create Hybrid Retriever ....')
-    hybrid_retriever = get_ensemble_retriever(docs, embedding_model, collection_name="hybrid_search", top_k=5)
+    hybrid_retriever = get_ensemble_retriever(docs, embedding_model, collection_name="hybrid_search", top_k=5,
+                                              persist_directory=".faiss_index")
 
 
 
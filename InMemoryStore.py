@@ -1,8 +1,16 @@
 from langchain_community.vectorstores import Chroma
 from langchain_core.runnables import Runnable
 from langchain_core.documents import Document
-from typing import Dict, List, Any, Optional
-from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+from collections import defaultdict, OrderedDict
+import pickle
+import sqlite3
+import threading
+
+import tiktoken
+
+import xxhash
+from tenacity import retry, stop_after_attempt, wait_exponential
 
 # Custom InMemoryStore Implementation
 # (InMemoryStore may not be available in some LangChain versions)
@@ -10,29 +18,185 @@ class InMemoryStore:
     """
     Simple in-memory document store for ParentDocumentRetriever.
     Stores documents keyed by their IDs.
+
+    Only the `capacity` most recently used documents stay live; older ones are
+    spilled to SQLite (UTF-8 content blobs) and reloaded on demand.
     """
-    def __init__(self):
-        self.store: Dict[str, Document] = {}
+    # Stay well under SQLite's bound-parameter limit (999 on older builds)
+    _BATCH = 500
+
+    def __init__(self, capacity: int = 4096, spill_path: str = ":memory:"):
+        """
+        Args:
+            capacity: Maximum number of documents kept as live objects
+            spill_path: SQLite database for evicted documents (":memory:" or a file path)
+        """
+        self.store: "OrderedDict[str, Document]" = OrderedDict()
+        self.capacity = capacity
+        # Retrievers may be called from several threads (e.g. MultiQueryRetriever)
+        self._lock = threading.Lock()
+        self.spill = sqlite3.connect(spill_path, check_same_thread=False)
+        self.spill.execute("CREATE TABLE IF NOT EXISTS docs(key TEXT PRIMARY KEY, content BLOB, metadata BLOB)")
+
+    def _evict(self) -> None:
+        """Move least recently used documents to the spill table."""
+        overflow = len(self.store) - self.capacity
+        if overflow <= 0:
+            return
+        evicted = [self.store.popitem(last=False) for _ in range(overflow)]
+        with self.spill:
+            self.spill.executemany(
+                "INSERT OR REPLACE INTO docs(key, content, metadata) VALUES (?, ?, ?)",
+                ((key, doc.page_content.encode("utf-8"), pickle.dumps(doc.metadata)) for key, doc in evicted)
+            )
+
+    def _load_spilled(self, keys: List[str]) -> Dict[str, Document]:
+        """Fetch spilled documents and promote them back to the live store."""
+        rows = []
+        with self.spill:
+            for i in range(0, len(keys), self._BATCH):
+                batch = keys[i:i + self._BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows.extend(self.spill.execute(
+                    f"SELECT key, content, metadata FROM docs WHERE key IN ({placeholders})", batch
+                ).fetchall())
+                self.spill.execute(f"DELETE FROM docs WHERE key IN ({placeholders})", batch)
+        loaded = {
+            key: Document(page_content=content.decode("utf-8"), metadata=pickle.loads(metadata))
+            for key, content, metadata in rows
+        }
+        self.store.update(loaded)
+        self._evict()
+        return loaded
 
     def mget(self, keys: List[str]) -> List[Optional[Document]]:
         """Get multiple documents by keys."""
-        return [self.store.get(key) for key in keys]
+        with self._lock:
+            # One lookup per distinct key; repeated keys reuse the first result
+            found = dict.fromkeys(keys)
+            for key in found:
+                doc = self.store.get(key)
+                if doc is not None:
+                    self.store.move_to_end(key)
+                found[key] = doc
+            missing = [key for key, doc in found.items() if doc is None]
+            if missing:
+                found.update(self._load_spilled(missing))
+            return [found[key] for key in keys]
 
     def mset(self, key_value_pairs: List[tuple]) -> None:
         """Set multiple key-value pairs."""
-        for key, value in key_value_pairs:
-            self.store[key] = value
+        with self._lock:
+            for key, value in key_value_pairs:
+                self.store[key] = value
+                self.store.move_to_end(key)
+            # Each key lives in exactly one tier
+            with self.spill:
+                self.spill.executemany("DELETE FROM docs WHERE key = ?", ((key,) for key, _ in key_value_pairs))
+            self._evict()
 
     def mdelete(self, keys: List[str]) -> None:
         """Delete multiple keys."""
-        for key in keys:
-            self.store.pop(key, None)
+        with self._lock:
+            for key in keys:
+                self.store.pop(key, None)
+            with self.spill:
+                self.spill.executemany("DELETE FROM docs WHERE key = ?", ((key,) for key in keys))
 
     def yield_keys(self, prefix: Optional[str] = None) -> List[str]:
         """Yield keys, optionally filtered by prefix."""
+        with self._lock:
+            keys = list(self.store.keys())
+            keys.extend(row[0] for row in self.spill.execute("SELECT key FROM docs"))
         if prefix:
-            return [key for key in self.store.keys() if key.startswith(prefix)]
-        return list(self.store.keys())
+            return [key for key in keys if key.startswith(prefix)]
+        return keys
+
+class TokenWindowSplitter:
+    """
+    Splits documents into fixed windows of tiktoken tokens.
+
+    All documents are tokenized in one batched call and windows are sliced from the
+    token ids, instead of measuring every candidate piece with the tokenizer as
+    RecursiveCharacterTextSplitter.from_tiktoken_encoder does.
+    """
+    def __init__(self, chunk_size: int, chunk_overlap: int = 0, model_name: str = "gpt-4", encoding=None):
+        """
+        Args:
+            chunk_size: Tokens per chunk
+            chunk_overlap: Tokens shared by consecutive chunks
+            model_name: Model whose tiktoken encoding is used
+            encoding: Already loaded tiktoken encoding, shared between splitters
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding = encoding or tiktoken.encoding_for_model(model_name)
+
+    def _splits_char(self, token: int) -> bool:
+        """True if the token starts with a UTF-8 continuation byte, i.e. a window can't begin at it."""
+        return self.encoding.decode_single_token_bytes(token)[0] & 0xC0 == 0x80
+
+    def _windows(self, ids: List[int]) -> List[List[int]]:
+        """Token windows whose edges fall on UTF-8 character boundaries."""
+        windows = []
+        start = 0
+        while start < len(ids):
+            end = min(start + self.chunk_size, len(ids))
+            # Byte-level tokens can split a multi-byte character; pull the edge back to the character start,
+            # or push it forward if the window holds no boundary at all
+            while start < end < len(ids) and self._splits_char(ids[end]):
+                end -= 1
+            if end == start:
+                end = start + self.chunk_size
+                while end < len(ids) and self._splits_char(ids[end]):
+                    end += 1
+            windows.append(ids[start:end])
+            if end >= len(ids):
+                break
+            next_start = end - self.chunk_overlap
+            while next_start > start and self._splits_char(ids[next_start]):
+                next_start -= 1
+            # No clean boundary inside the overlap: start the next window without one
+            start = next_start if next_start > start else end
+        return windows
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """Split documents into token windows, keeping each document's metadata."""
+        return self.split_documents_with_tokens(documents)[0]
+
+    def split_documents_with_tokens(self, documents: List[Document]) -> Tuple[List[Document], List[List[int]]]:
+        """Like split_documents, but also return each chunk's token ids so a finer splitter can reuse them."""
+        token_ids = self.encoding.encode_ordinary_batch([doc.page_content for doc in documents])
+        return self.split_tokenized(documents, token_ids)
+
+    def split_tokenized(self, documents: List[Document], token_ids: List[List[int]]) -> Tuple[List[Document], List[List[int]]]:
+        """Split documents whose token ids (under this splitter's encoding) are already known.
+
+        Returns the chunks and their token ids, in the same order.
+        """
+        windows = []
+        metadatas = []
+        for doc, ids in zip(documents, token_ids):
+            for window in self._windows(ids):
+                windows.append(window)
+                metadatas.append(doc.metadata)
+
+        # Strict decoding: window edges are character boundaries, so a U+FFFD replacement can never slip in
+        texts = [raw.decode("utf-8") for raw in self.encoding.decode_bytes_batch(windows)]
+        chunks = []
+        chunk_ids = []
+        for text, window, metadata in zip(texts, windows, metadatas):
+            if text.strip():
+                chunks.append(Document(page_content=text.strip(), metadata=dict(metadata)))
+                chunk_ids.append(window)
+        return chunks, chunk_ids
+
+@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, max=30), reraise=True)
+def _embed_documents(embeddings_model, texts: List[str]) -> List[List[float]]:
+    """embed_documents, retried with exponential backoff (rate limits, transient 5xx)."""
+    return embeddings_model.embed_documents(texts)
 
 # Custom ParentDocumentRetriever Implementation
 # (ParentDocumentRetriever may not be available in some LangChain versions)
@@ -52,7 +216,8 @@ class ParentDocumentRetriever(Runnable):
         child_splitter,
         parent_splitter,
         k: int = 4,
-        search_kwargs: Optional[Dict] = None
+        search_kwargs: Optional[Dict] = None,
+        batch_size: int = 250
     ):
         super().__init__()
         self.vectorstore = vectorstore
@@ -61,6 +226,8 @@ class ParentDocumentRetriever(Runnable):
         self.parent_splitter = parent_splitter
         self.k = k
         self.search_kwargs = search_kwargs or {}
+        # Child chunks are embedded and written to the vectorstore this many at a time
+        self.batch_size = batch_size
 
     @property
     def InputType(self):
@@ -77,31 +244,99 @@ class ParentDocumentRetriever(Runnable):
 
         Process:
         1. Split into parent documents
-        2. For each parent, split into child chunks
-        3. Store parents in docstore
-        4. Index child chunks in vectorstore (with reference to parent)
+        2. Store parents in docstore
+        3. Split parents into child chunks, a group at a time
+        4. Index child chunks in vectorstore (with reference to parent) as each batch fills
         """
-        parent_docs = self.parent_splitter.split_documents(documents)
-
-        for parent_doc in parent_docs:
-            # Create unique ID for parent
-            parent_id = f"parent_{hash(parent_doc.page_content)}"
-
-            # Store parent in docstore
-            self.docstore.mset([(parent_id, parent_doc)])
-
-            # Split parent into child chunks
-            child_docs = self.child_splitter.split_documents([parent_doc])
-
-            # Add parent_id to child metadata
-            for child_doc in child_docs:
-                if child_doc.metadata is None:
-                    child_doc.metadata = {}
-                child_doc.metadata["parent_id"] = parent_id
-
-            # Add child chunks to vectorstore
-            if child_docs:
-                self.vectorstore.add_documents(child_docs)
+        # Drop repeated input documents (e.g. re-ingested pages); a later copy replaces an earlier one
+        unique_docs = {}
+        for doc in documents:
+            unique_docs[xxhash.xxh3_64_hexdigest(doc.page_content.encode())] = doc
+        if self._shares_tokens():
+            # Keep the parents' token ids so child windows are sliced from them instead of re-encoded
+            parent_docs, parent_tokens = self.parent_splitter.split_documents_with_tokens(list(unique_docs.values()))
+        else:
+            parent_docs = self.parent_splitter.split_documents(list(unique_docs.values()))
+            parent_tokens = None
+
+        # Identical parents would share an id, so split, embed and index each one only once
+        unique_parents = {}
+        tokens_by_parent = {}
+        for i, parent_doc in enumerate(parent_docs):
+            # Create unique ID for parent; a content digest, unlike hash(), is stable across processes
+            parent_id = "parent_" + xxhash.xxh3_64_hexdigest(parent_doc.page_content.encode())
+            unique_parents[parent_id] = parent_doc
+            if parent_tokens is not None:
+                tokens_by_parent[parent_id] = parent_tokens[i]
+
+        # Store all parents in docstore at once, before any child that points at them is indexed
+        self.docstore.mset(list(unique_parents.items()))
+
+        # Add child chunks to vectorstore in batches: one embedding call and one write per batch.
+        # Children are streamed, so only one batch of them is alive at a time
+        batch: List[Document] = []
+        for child_doc in self._iter_children(unique_parents, tokens_by_parent):
+            batch.append(child_doc)
+            if len(batch) >= self.batch_size:
+                self._index_children(batch)
+                batch = []
+        if batch:
+            self._index_children(batch)
+
+    def _index_children(self, child_docs: List[Document]) -> None:
+        """Embed one batch of child chunks explicitly and write it to the vectorstore.
+
+        For Chroma the precomputed vectors go straight into the collection, so Chroma never
+        runs its own embedding pass; other vectorstores fall back to add_documents.
+        """
+        embeddings_model = getattr(self.vectorstore, "embeddings", None)
+        collection = getattr(self.vectorstore, "_collection", None)
+        if embeddings_model is None or collection is None:
+            self.vectorstore.add_documents(child_docs)
+            return
+
+        # Deterministic ids make re-ingesting the same documents an overwrite rather than a duplicate;
+        # a chunk repeated within one parent is kept once
+        unique_children = {}
+        for child_doc in child_docs:
+            child_id = xxhash.xxh3_128_hexdigest(f"{child_doc.metadata['parent_id']}\0{child_doc.page_content}".encode())
+            unique_children[child_id] = child_doc
+
+        texts = [child_doc.page_content for child_doc in unique_children.values()]
+        collection.upsert(
+            ids=list(unique_children),
+            embeddings=_embed_documents(embeddings_model, texts),
+            documents=texts,
+            metadatas=[child_doc.metadata for child_doc in unique_children.values()],
+        )
+
+    def _shares_tokens(self) -> bool:
+        """True if both splitters are token-window splitters over the same encoding."""
+        return (
+            isinstance(self.parent_splitter, TokenWindowSplitter)
+            and isinstance(self.child_splitter, TokenWindowSplitter)
+            and self.parent_splitter.encoding.name == self.child_splitter.encoding.name
+        )
+
+    def _iter_children(self, parents: Dict[str, Document], parent_tokens: Optional[Dict[str, List[int]]] = None):
+        """Yield child chunks tagged with their parent_id.
+
+        Parents are split batch_size at a time, keeping the splitter's batched tokenization
+        while holding only one group's children in memory. When parent_tokens is given,
+        child windows are sliced from those ids and the parents are not tokenized again.
+        """
+        items = list(parents.items())
+        for start in range(0, len(items), self.batch_size):
+            group = items[start:start + self.batch_size]
+            # Chunks copy the metadata of the document they come from, so parent_id reaches every child
+            child_inputs = [
+                Document(page_content=parent_doc.page_content, metadata={**(parent_doc.metadata or {}), "parent_id": parent_id})
+                for parent_id, parent_doc in group
+            ]
+            if parent_tokens:
+                yield from self.child_splitter.split_tokenized(child_inputs, [parent_tokens[parent_id] for parent_id, _ in group])[0]
+            else:
+                yield from self.child_splitter.split_documents(child_inputs)
 
     def invoke(self, input: Any, config: Any = None, **kwargs: Any) -> List[Document]:
         """Retrieve parent documents for a query.
@@ -122,12 +357,10 @@ class ParentDocumentRetriever(Runnable):
         search_kwargs = {**self.search_kwargs, "k": self.k}
         child_docs = self.vectorstore.similarity_search(query, **search_kwargs)
 
-        # Get unique parent IDs
-        parent_ids = set()
-        for child_doc in child_docs:
-            parent_id = child_doc.metadata.get("parent_id")
-            if parent_id:
-                parent_ids.add(parent_id)
+        # Get unique parent IDs, in the rank order of their best child
+        parent_ids = dict.fromkeys(
+            child_doc.metadata["parent_id"] for child_doc in child_docs if child_doc.metadata.get("parent_id")
+        )
 
         # Retrieve parent documents
         parent_docs = self.docstore.mget(list(parent_ids))
@@ -165,24 +398,13 @@ def create_parent_retriever(
     - ValueError: If any input parameter is invalid.
     """
 
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    # Both splitters share one encoding; each tokenizes its whole input in a single batch
+    encoding = tiktoken.encoding_for_model("gpt-4")
 
-    parent_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        separators=["\n\n\n", "\n\n", "\n", ".", ""],
-        chunk_size=512,
-        chunk_overlap=0,
-        model_name="gpt-4",
-        is_separator_regex=False,
-    )
+    parent_splitter = TokenWindowSplitter(chunk_size=512, chunk_overlap=0, encoding=encoding)
 
     # This text splitter is used to create the child documents
-    child_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        separators=["\n\n\n", "\n\n", "\n", ".", ""],
-        chunk_size=256,
-        chunk_overlap=0,
-        model_name="gpt-4",
-        is_separator_regex=False,
-    )
+    child_splitter = TokenWindowSplitter(chunk_size=256, chunk_overlap=0, encoding=encoding)
 
     # The vectorstore to use to index the child chunks
     vectorstore = Chroma(
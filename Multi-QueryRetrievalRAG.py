@@ -1,19 +1,16 @@
-import os
-
-
-from langchain.chat_models import init_chat_model
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+import tiktoken
 
 from rich import print
 
 from MultiQueryRetriever import MultiQueryRetriever
 from dotenv import load_dotenv
 
-from embeddingsUtiles import load_embedding_model
-from utiles import get_retriever, load_pdf_docling
+from llm_singletons import get_llm, get_embedding_model
+from utiles import get_retriever, load_pdf_docling_cached
 
 load_dotenv()
 
@@ -27,13 +24,7 @@ def get_query(input_dict):
 
 if __name__ == '__main__':
     query = "What are the specific factors contributing to Airbnb's increased operational expenses in the last fiscal year?"
-    llm = init_chat_model(
-        model="deepseek-reasoner",
-        api_key=os.getenv("DEEPSEEK_API_KEY"),
-        base_url=os.getenv("DEEPSEEK_BASE_URL"),
-        model_provider="openai",
-        temperature=0
-    )
+    llm = get_llm(model="deepseek-reasoner", temperature=0)
 
     # Decomposition
     template = """You are a helpful assistant that generates multiple sub-questions related to an input question.
@@ -57,13 +48,15 @@ if __name__ == '__main__':
     print("-----------------------------------------")    # Load your retriever here (e.g., Chroma, FAISS, etc.)
 
 
-    documents = load_pdf_docling("./data/8a9ebed0-815a-469a-87eb-1767d21d8cec.pdf")
+    documents = load_pdf_docling_cached("./data/8a9ebed0-815a-469a-87eb-1767d21d8cec.pdf")
 
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+    # Token lengths via encode_ordinary: no special-token scan on every measured piece
+    encoding = tiktoken.encoding_for_model("gpt-4")
+    text_splitter = RecursiveCharacterTextSplitter(
         # separators=["\n\n\n", "\n\n"],
         chunk_size=1024,
         chunk_overlap=0,
-        model_name="gpt-4",
+        length_function=lambda text: len(encoding.encode_ordinary(text)),
         add_start_index=True,  # If `True`, includes chunk's start index in metadata
         strip_whitespace=True,  # If `True`, strips whitespace from the start and end of every document
     )
@@ -75,7 +68,7 @@ if __name__ == '__main__':
     # ============================================
     # The Embedding Model
     # ============================================
-    embedding_model = load_embedding_model()
+    embedding_model = get_embedding_model()
 
     abnb_retriever = get_retriever(docs, embedding_model, top_k=10, collection_name="airbnb-1")
 
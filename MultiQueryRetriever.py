@@ -1,7 +1,36 @@
 from langchain_core.runnables import RunnablePassthrough, Runnable
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from typing import List, Any
+from langchain_core.documents import Document
+from typing import List, Any, Optional
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import xxhash
+
+def _query_key(query: str) -> str:
+    """Lowercased, punctuation-stripped, whitespace-collapsed form used to spot duplicate queries."""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", query.lower())).strip()
+
+def _bloom_unique(docs) -> List[Any]:
+    """Drop repeated documents using a Bloom filter sized for ~0.1% false positives.
+
+    20 bits per candidate and 4 probes, taken from the four 32-bit words of one
+    xxh3-128 digest of the content.
+    """
+    num_bits = max(64, 20 * len(docs))
+    bits = bytearray((num_bits + 7) // 8)
+    unique_docs = []
+    for doc in docs:
+        digest = xxhash.xxh3_128_intdigest(doc.page_content.encode())
+        positions = [((digest >> (32 * i)) & 0xFFFFFFFF) % num_bits for i in range(4)]
+        if all(bits[p >> 3] & (1 << (p & 7)) for p in positions):
+            continue
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        unique_docs.append(doc)
+    return unique_docs
 
 # Custom Multi-Query Retriever Implementation
 # (MultiQueryRetriever may not be available in some LangChain versions)
@@ -10,11 +39,16 @@ class MultiQueryRetriever(Runnable):
     Custom implementation of multi-query retriever.
     Generates multiple query variations and retrieves documents for each.
     """
-    def __init__(self, retriever, llm, num_queries=3):
+    def __init__(self, retriever, llm, num_queries=3, max_concurrency=5, exact_dedup=True):
         super().__init__()
         self.retriever = retriever
         self.llm = llm
         self.num_queries = num_queries
+        # Upper bound on sub-queries in flight against the retriever / embedding API
+        self.max_concurrency = max_concurrency
+        # False dedups with a Bloom filter: less memory for very large candidate sets,
+        # at a ~0.1% chance of dropping a unique document
+        self.exact_dedup = exact_dedup
 
         # Prompt for generating query variations
         self.query_generation_prompt = ChatPromptTemplate.from_messages([
@@ -45,46 +79,125 @@ class MultiQueryRetriever(Runnable):
             "question": question,
             "num_queries": self.num_queries
         })
+        return self._parse_queries(question, result)
 
+    async def _agenerate_queries(self, question: str) -> List[str]:
+        """Async version of _generate_queries."""
+        chain = self.query_generation_prompt | self.llm | StrOutputParser()
+        result = await chain.ainvoke({
+            "question": question,
+            "num_queries": self.num_queries
+        })
+        return self._parse_queries(question, result)
+
+    def _parse_queries(self, question: str, result: str) -> List[str]:
+        """Split the LLM output into queries."""
         # Parse the generated queries (split by newlines)
         queries = [q.strip() for q in result.split("\n") if q.strip()]
 
-        # Always include the original question
-        if question not in queries:
-            queries.insert(0, question)
-
-        # Limit to num_queries
-        return queries[:self.num_queries]
+        # Always include the original question, first; drop variations that only differ
+        # in case, punctuation or spacing, since each one costs a full retrieval
+        unique = [question]
+        seen = {_query_key(question)}
+        for q in queries:
+            key = _query_key(q)
+            if key and key not in seen:
+                seen.add(key)
+                unique.append(q)
 
-    def invoke(self, input: Any, config: Any = None, **kwargs: Any):
-        """Retrieve documents using multiple query variations.
+        # The original plus up to num_queries variations, as many as the prompt asks for
+        return unique[:self.num_queries + 1]
 
-        Accepts either a string query or a dict with 'question' or 'input' key.
-        """
-        # Extract query string from input
+    @staticmethod
+    def _extract_query(input: Any) -> str:
+        """Accept either a string query or a dict with 'question' or 'input' key."""
         if isinstance(input, dict):
-            query = input.get("question", input.get("input", ""))
-        else:
-            query = str(input)
+            return input.get("question", input.get("input", ""))
+        return str(input)
 
-        # Generate query variations
-        queries = self._generate_queries(query)
+    def _unique_documents(self, results):
+        """Flatten per-query results in query order, dropping duplicates."""
+        if not self.exact_dedup:
+            return _bloom_unique([doc for docs in results for doc in docs])
 
-        # Retrieve documents for each query
         all_docs = []
         seen_docs = set()
 
-        for q in queries:
-            docs = self.retriever.invoke(q)
+        for docs in results:
             for doc in docs:
                 # Use content hash to deduplicate
-                doc_hash = hash(doc.page_content)
+                doc_hash = xxhash.xxh3_64_intdigest(doc.page_content.encode())
                 if doc_hash not in seen_docs:
                     seen_docs.add(doc_hash)
                     all_docs.append(doc)
 
         return all_docs
 
+    def _batch_retrieve(self, queries: List[str]) -> Optional[List[List[Document]]]:
+        """Embed all queries in one call and search them in one Chroma query.
+
+        Returns None when the retriever isn't a plain similarity retriever over Chroma,
+        in which case queries are sent to the retriever one by one.
+        """
+        vectorstore = getattr(self.retriever, "vectorstore", None)
+        collection = getattr(vectorstore, "_collection", None)
+        embedding_function = getattr(vectorstore, "_embedding_function", None)
+        if collection is None or embedding_function is None or getattr(self.retriever, "search_type", None) != "similarity":
+            return None
+
+        search_kwargs = self.retriever.search_kwargs
+        # embed_documents batches the queries into one model call; BGE embeds queries and documents alike
+        raw = collection.query(
+            query_embeddings=embedding_function.embed_documents(queries),
+            n_results=search_kwargs.get("k", 4),
+            where=search_kwargs.get("filter"),
+        )
+        return [
+            [
+                Document(id=doc_id, page_content=text, metadata=metadata or {})
+                for doc_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(raw["ids"], raw["documents"], raw["metadatas"])
+        ]
+
+    def invoke(self, input: Any, config: Any = None, **kwargs: Any):
+        """Retrieve documents using multiple query variations.
+
+        Accepts either a string query or a dict with 'question' or 'input' key.
+        """
+        query = self._extract_query(input)
+
+        # Retrieve documents for all queries concurrently; embedding and vectorstore calls are I/O bound
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            # The original question is retrieved while the LLM generates the variations
+            original_future = executor.submit(self.retriever.invoke, query)
+            queries = self._generate_queries(query)[1:]
+            batched = self._batch_retrieve(queries) if len(queries) > 1 else None
+            if batched is None:
+                batched = list(executor.map(self.retriever.invoke, queries))
+            results = [original_future.result(), *batched]
+
+        return self._unique_documents(results)
+
+    async def ainvoke(self, input: Any, config: Any = None, **kwargs: Any):
+        """Async version of invoke; sub-queries run concurrently on the event loop."""
+        query = self._extract_query(input)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def retrieve(q: str):
+            async with semaphore:
+                return await self.retriever.ainvoke(q)
+
+        # The original question is retrieved while the LLM generates the variations
+        original_task = asyncio.create_task(retrieve(query))
+        queries = (await self._agenerate_queries(query))[1:]
+        batched = await asyncio.to_thread(self._batch_retrieve, queries) if len(queries) > 1 else None
+        if batched is None:
+            batched = await asyncio.gather(*(retrieve(q) for q in queries))
+        results = [await original_task, *batched]
+        return self._unique_documents(results)
+
     def get_relevant_documents(self, query: str):
         """Compatibility method for older API."""
         return self.invoke(query)
@@ -1,5 +1,7 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import asyncio
 import shutil
 import os
 import traceback
@@ -13,12 +15,15 @@ from dotenv import load_dotenv
 # dirname -> /YT (where .env is)
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env'))
 
-from rag_core import load_pdf, split_text, create_vector_store, retrieve_documents, rerank_documents, convert_to_markdown, generate_answer, expand_query, create_parent_child_index, retrieve_parent_child, get_text_embedding
-from models import ProcessRequest, ProcessResponse, QueryRequest, QueryResponse, SearchResult, RerankRequest, RerankResponse, ConversionResponse, GenerateRequest, GenerateResponse, ExpansionRequest, ExpansionResponse, ParentChildResponse
+from rag_core import load_pdf, split_text, create_vector_store, retrieve_documents, rerank_documents, convert_to_markdown, create_parent_child_index, retrieve_parent_child, get_text_embedding, get_text_embedding_batch, pack_embedding, start_model_warmup, retrieve_and_rerank, agenerate_answer, astream_answer, aexpand_query
+from models import ProcessRequest, ProcessResponse, QueryRequest, QueryResponse, SearchResult, RerankRequest, RerankResponse, ConversionResponse, GenerateRequest, GenerateResponse, ExpansionRequest, ExpansionResponse, ParentChildResponse, RetrieveRerankRequest, RetrieveRerankResponse
 from langchain_core.documents import Document
 
 app = FastAPI()
 
+# Models load while the server starts up; request handlers block on the same lock if they get there first
+start_model_warmup()
+
 # Allow CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -34,8 +39,8 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 @app.post("/api/process_pc", response_model=ProcessResponse)
 async def process_parent_child(request: ProcessRequest):
     try:
-        docs = load_pdf(request.file_path)
-        collection_name = create_parent_child_index(docs)
+        docs = await asyncio.to_thread(load_pdf, request.file_path)
+        collection_name = await asyncio.to_thread(create_parent_child_index, docs)
         return ProcessResponse(
             collection_name=collection_name,
             num_chunks=0, # Not easily countable here
@@ -48,13 +53,16 @@ async def process_parent_child(request: ProcessRequest):
 @app.post("/api/query_pc", response_model=ParentChildResponse)
 async def query_parent_child(request: QueryRequest):
     try:
-        query_embedding = get_text_embedding(request.query)
-        parents, children = retrieve_parent_child(request.query, request.collection_name, request.top_k)
+        # Embedding and retrieval are independent; run both off the event loop at once
+        query_embedding, (parents, children) = await asyncio.gather(
+            asyncio.to_thread(get_text_embedding, request.query),
+            asyncio.to_thread(retrieve_parent_child, request.query, request.collection_name, request.top_k)
+        )
         
         formatted_parents = [SearchResult(content=p.page_content, score=1.0, metadata=p.metadata) for p in parents]
         formatted_children = [SearchResult(content=c[0].page_content, score=c[1], metadata=c[0].metadata) for c in children]
         
-        return ParentChildResponse(parents=formatted_parents, children=formatted_children, query_embedding=query_embedding)
+        return ParentChildResponse(parents=formatted_parents, children=formatted_children, query_embedding=pack_embedding(query_embedding))
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -62,7 +70,7 @@ async def query_parent_child(request: QueryRequest):
 @app.post("/api/expand", response_model=ExpansionResponse)
 async def expand_query_endpoint(request: ExpansionRequest):
     try:
-        queries = expand_query(request.query)
+        queries = await aexpand_query(request.query)
         return ExpansionResponse(queries=queries)
     except Exception as e:
         traceback.print_exc()
@@ -71,16 +79,21 @@ async def expand_query_endpoint(request: ExpansionRequest):
 @app.post("/api/generate", response_model=GenerateResponse)
 async def generate_response(request: GenerateRequest):
     try:
-        answer = generate_answer(request.query, request.context_chunks)
+        answer = await agenerate_answer(request.query, request.context_chunks)
         return GenerateResponse(answer=answer)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/generate_stream")
+async def generate_response_stream(request: GenerateRequest):
+    # Plain-text token stream: the client can render the answer while it is still being generated
+    return StreamingResponse(astream_answer(request.query, request.context_chunks), media_type="text/plain; charset=utf-8")
+
 @app.post("/api/convert", response_model=ConversionResponse)
 async def convert_document(request: ProcessRequest):
     try:
-        markdown = convert_to_markdown(request.file_path)
+        markdown = await asyncio.to_thread(convert_to_markdown, request.file_path)
         return ConversionResponse(markdown_content=markdown)
     except Exception as e:
         traceback.print_exc()
@@ -89,13 +102,26 @@ async def convert_document(request: ProcessRequest):
 @app.post("/api/rerank", response_model=RerankResponse)
 async def rerank_results(request: RerankRequest):
     try:
-        query_embedding = get_text_embedding(request.query)
         # Reconstruct Document objects from input
         docs = []
+        embeddings = {}
         for res in request.initial_results:
-            docs.append(Document(page_content=res.content, metadata=res.metadata))
+            doc = Document(page_content=res.content, metadata=res.metadata)
+            docs.append(doc)
+            # Results from /api/query already carry their stored embeddings, packed; they are passed through as is
+            embeddings[id(doc)] = res.embedding
             
-        reranked = rerank_documents(request.query, docs, request.top_k)
+        # Blocking model calls run in worker threads so other requests aren't stalled
+        query_embedding, reranked = await asyncio.gather(
+            asyncio.to_thread(get_text_embedding, request.query),
+            asyncio.to_thread(rerank_documents, request.query, docs, request.top_k)
+        )
+
+        # Embed only the results that came without an embedding, in one batch
+        missing = [doc for doc, _ in reranked if embeddings[id(doc)] is None]
+        missing_embeddings = await asyncio.to_thread(get_text_embedding_batch, [doc.page_content for doc in missing])
+        for doc, embedding in zip(missing, missing_embeddings):
+            embeddings[id(doc)] = pack_embedding(embedding)
         
         formatted_results = []
         for doc, score in reranked:
@@ -103,10 +129,33 @@ async def rerank_results(request: RerankRequest):
                 content=doc.page_content,
                 score=float(score), # Ensure float for JSON serialization
                 metadata=doc.metadata,
-                embedding=get_text_embedding(doc.page_content)
+                embedding=embeddings[id(doc)]
             ))
             
-        return RerankResponse(results=formatted_results, query_embedding=query_embedding)
+        return RerankResponse(results=formatted_results, query_embedding=pack_embedding(query_embedding))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/retrieve_rerank", response_model=RetrieveRerankResponse)
+async def retrieve_and_rerank_endpoint(request: RetrieveRerankRequest):
+    try:
+        # The original query is embedded while the LLM expands it; retrieve_and_rerank then finds it cached
+        queries, _ = await asyncio.gather(
+            aexpand_query(request.query),
+            asyncio.to_thread(get_text_embedding, request.query)
+        )
+        # Retrieval for all variants and one reranking pass, in a single round trip
+        queries, reranked, query_embedding = await asyncio.to_thread(
+            retrieve_and_rerank, request.query, request.collection_name, request.retrieve_k, request.top_k, queries
+        )
+        
+        formatted_results = [
+            SearchResult(content=doc.page_content, score=score, metadata=doc.metadata, embedding=pack_embedding(embedding))
+            for doc, score, embedding in reranked
+        ]
+        
+        return RetrieveRerankResponse(queries=queries, results=formatted_results, query_embedding=pack_embedding(query_embedding))
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -115,12 +164,18 @@ async def rerank_results(request: RerankRequest):
 def read_root():
     return {"message": "RAG Webinar API is running"}
 
+# Copy uploads in 1 MiB blocks; shutil's default buffer means thousands of read/write calls per PDF
+_UPLOAD_BLOCK_SIZE = 1 << 20
+
+def _save_upload(source, file_path: str):
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(source, buffer, length=_UPLOAD_BLOCK_SIZE)
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     try:
         file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await asyncio.to_thread(_save_upload, file.file, file_path)
         return {"file_path": file_path, "filename": file.filename}
     except Exception as e:
         traceback.print_exc()
@@ -130,23 +185,23 @@ async def upload_file(file: UploadFile = File(...)):
 async def process_document(request: ProcessRequest):
     try:
         # 1. Load PDF
-        docs = load_pdf(request.file_path)
+        docs = await asyncio.to_thread(load_pdf, request.file_path)
         
         # 2. Split Text
-        chunks = split_text(docs, chunk_size=request.chunk_size, chunk_overlap=request.chunk_overlap)
+        chunks = await asyncio.to_thread(split_text, docs, chunk_size=request.chunk_size, chunk_overlap=request.chunk_overlap)
         
         # 3. Create Vector Store
-        vector_store, collection_name = create_vector_store(chunks)
+        vector_store, collection_name = await asyncio.to_thread(create_vector_store, chunks)
         
         # Prepare preview
         preview = [chunk.page_content[:200] + "..." for chunk in chunks[:3]]
-        embedding_preview = get_text_embedding(chunks[0].page_content) if chunks else None
+        embedding_preview = await asyncio.to_thread(get_text_embedding, chunks[0].page_content) if chunks else None
         
         return ProcessResponse(
             collection_name=collection_name,
             num_chunks=len(chunks),
             preview_chunks=preview,
-            embedding_preview=embedding_preview
+            embedding_preview=pack_embedding(embedding_preview)
         )
     except Exception as e:
         traceback.print_exc()
@@ -155,20 +210,20 @@ async def process_document(request: ProcessRequest):
 @app.post("/api/query", response_model=QueryResponse)
 async def query_document(request: QueryRequest):
     try:
-        query_embedding = get_text_embedding(request.query)
-        results = retrieve_documents(request.query, request.collection_name, request.top_k)
+        query_embedding = await asyncio.to_thread(get_text_embedding, request.query)
+        results = await asyncio.to_thread(retrieve_documents, request.query, request.collection_name, request.top_k, query_embedding=query_embedding)
         
-        # Format results (Chroma returns (doc, score) tuples)
+        # Format results ((doc, score, stored embedding) triples)
         formatted_results = []
-        for doc, score in results:
+        for doc, score, embedding in results:
             formatted_results.append(SearchResult(
                 content=doc.page_content,
                 score=score,
                 metadata=doc.metadata,
-                embedding=get_text_embedding(doc.page_content)
+                embedding=pack_embedding(embedding)
             ))
             
-        return QueryResponse(results=formatted_results, query_embedding=query_embedding)
+        return QueryResponse(results=formatted_results, query_embedding=pack_embedding(query_embedding))
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
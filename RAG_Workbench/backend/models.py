@@ -1,6 +1,8 @@
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 
+# Embedding fields carry base64-encoded little-endian float16 vectors (see rag_core.pack_embedding)
+
 class ProcessRequest(BaseModel):
     file_path: str
     chunk_size: int = 1000
@@ -10,7 +12,7 @@ class ProcessResponse(BaseModel):
     collection_name: str
     num_chunks: int
     preview_chunks: List[str]
-    embedding_preview: Optional[List[float]] = None
+    embedding_preview: Optional[str] = None
 
 class QueryRequest(BaseModel):
     query: str
@@ -21,11 +23,11 @@ class SearchResult(BaseModel):
     content: str
     score: float
     metadata: Dict[str, Any]
-    embedding: Optional[List[float]] = None
+    embedding: Optional[str] = None
 
 class QueryResponse(BaseModel):
     results: List[SearchResult]
-    query_embedding: Optional[List[float]] = None
+    query_embedding: Optional[str] = None
 
 class RerankRequest(BaseModel):
     query: str
@@ -34,7 +36,18 @@ class RerankRequest(BaseModel):
 
 class RerankResponse(BaseModel):
     results: List[SearchResult]
-    query_embedding: Optional[List[float]] = None
+    query_embedding: Optional[str] = None
+
+class RetrieveRerankRequest(BaseModel):
+    query: str
+    collection_name: str
+    retrieve_k: int = 5
+    top_k: int = 3
+
+class RetrieveRerankResponse(BaseModel):
+    queries: List[str]
+    results: List[SearchResult]
+    query_embedding: Optional[str] = None
 
 class ConversionResponse(BaseModel):
     markdown_content: str
@@ -55,4 +68,4 @@ class ExpansionResponse(BaseModel):
 class ParentChildResponse(BaseModel):
     parents: List[SearchResult]
     children: List[SearchResult]
-    query_embedding: Optional[List[float]] = None
+    query_embedding: Optional[str] = None
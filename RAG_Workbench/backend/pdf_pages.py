@@ -0,0 +1,76 @@
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import pymupdf
+
+# Kept free of rag_core's imports so spawned workers start without loading torch or the models
+
+# Below this many pages the pool's IPC costs more than it saves
+PARALLEL_MIN_PAGES = 32
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: the server process holds torch and tokenizer threads
+                _pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def _extract_range(file_path: str, start: int, stop: int) -> List[str]:
+    # Each worker opens the document once for its whole range
+    with pymupdf.open(file_path) as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+
+# Pages averaging less text than this are likely scanned and need OCR
+MIN_TEXT_CHARS_PER_PAGE = 100
+
+
+def text_only_pages(file_path: str) -> Optional[List[str]]:
+    """
+    Page texts if plain PyMuPDF extraction does the PDF justice; None if it has images, tables
+    or too little text layer and needs layout analysis. The texts are the preflight's own
+    extraction, so a text-only PDF is read once.
+    """
+    with pymupdf.open(file_path) as doc:
+        pages = []
+        for page in doc:
+            if page.get_images():
+                return None
+            pages.append(page.get_text("text"))
+        if sum(len(text.strip()) for text in pages) < MIN_TEXT_CHARS_PER_PAGE * max(doc.page_count, 1):
+            return None
+        # Table detection is the costliest check, so it runs only once the cheap ones have passed
+        if any(page.find_tables().tables for page in doc):
+            return None
+        return pages
+
+
+def extract_pages(file_path: str) -> List[str]:
+    """Returns the text of every page, splitting large PDFs across worker processes."""
+    # PyMuPDF is not thread-safe and holds the GIL, so parallelism has to come from processes
+    with pymupdf.open(file_path) as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_MIN_PAGES:
+            return [page.get_text("text") for page in doc]
+
+    workers = min(os.cpu_count() or 1, page_count)
+    step = -(-page_count // workers)
+    starts = range(0, page_count, step)
+    futures = [
+        _get_pool().submit(_extract_range, file_path, start, min(start + step, page_count))
+        for start in starts
+    ]
+    return [text for future in futures for text in future.result()]
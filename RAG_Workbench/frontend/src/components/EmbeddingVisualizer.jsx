@@ -1,6 +1,29 @@
 import React from 'react';
 
-const EmbeddingVisualizer = ({ embedding, height = 40, className = "" }) => {
+// IEEE 754 half-precision bits -> number
+const halfToFloat = (bits) => {
+    const sign = bits & 0x8000 ? -1 : 1;
+    const exponent = (bits >> 10) & 0x1f;
+    const fraction = bits & 0x3ff;
+    if (exponent === 0) return sign * Math.pow(2, -14) * (fraction / 1024);
+    if (exponent === 0x1f) return fraction ? NaN : sign * Infinity;
+    return sign * Math.pow(2, exponent - 15) * (1 + fraction / 1024);
+};
+
+// The API sends embeddings as base64-encoded little-endian float16 (see pack_embedding in rag_core.py)
+export const decodeEmbedding = (embedding) => {
+    if (typeof embedding !== 'string') return embedding;
+    const bytes = Uint8Array.from(atob(embedding), (c) => c.charCodeAt(0));
+    const view = new DataView(bytes.buffer);
+    const values = new Array(bytes.length / 2);
+    for (let i = 0; i < values.length; i++) {
+        values[i] = halfToFloat(view.getUint16(i * 2, true));
+    }
+    return values;
+};
+
+const EmbeddingVisualizer = ({ embedding: packedEmbedding, height = 40, className = "" }) => {
+    const embedding = decodeEmbedding(packedEmbedding);
     if (!embedding || embedding.length === 0) return null;
 
     // Normalize values for visualization (assuming they are roughly -1 to 1, but we want 0-1 for color/opacity)
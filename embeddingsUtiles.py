@@ -12,7 +12,7 @@ import os
 class BGEEmbeddings(Embeddings):
     """Custom embedding class that wraps SentenceTransformer for BGE models."""
 
-    def __init__(self, model_name: str, device: str = None, normalize: bool = True):
+    def __init__(self, model_name: str, device: str = None, normalize: bool = True, batch_size: int = 64):
         """
         Initialize BGE embeddings.
 
@@ -20,9 +20,11 @@ class BGEEmbeddings(Embeddings):
             model_name: HuggingFace model name (e.g., "BAAI/bge-small-en-v1.5")
             device: Device to use ("cpu", "cuda", "mps"). If None, auto-detects.
             normalize: Whether to normalize embeddings (recommended for cosine similarity)
+            batch_size: Texts per forward pass; encode() length-sorts its input, so batches pad to similar lengths
         """
         self.model_name = model_name
         self.normalize = normalize
+        self.batch_size = batch_size
 
         # Auto-detect device if not specified
         if device is None:
@@ -50,23 +52,24 @@ class BGEEmbeddings(Embeddings):
         """Embed a list of documents."""
         embeddings = self.model.encode(
             texts,
+            batch_size=self.batch_size,
             normalize_embeddings=self.normalize,
-            convert_to_numpy=True
+            convert_to_numpy=True,
+            show_progress_bar=False
         )
-        # Convert NumPy array to native Python list
-        if isinstance(embeddings, np.ndarray):
-            return embeddings.tolist()
-        return [[float(x) for x in emb] for emb in embeddings]
+        # Convert NumPy array to native Python list in one pass
+        return np.asarray(embeddings, dtype=np.float32).tolist()
 
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query."""
         embedding = self.model.encode(
             text,
             normalize_embeddings=self.normalize,
-            convert_to_numpy=True
+            convert_to_numpy=True,
+            show_progress_bar=False
         )
-        # Ensure native Python types (fixes ChromaDB NumPy compatibility)
-        return [float(x) for x in embedding.tolist()]
+        # Ensure native Python types (fixes ChromaDB NumPy compatibility); tolist() yields Python floats
+        return np.asarray(embedding, dtype=np.float32).tolist()
 def load_embedding_model(
     model_name = "BAAI/bge-large-en-v1.5",
     device = None
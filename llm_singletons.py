@@ -0,0 +1,62 @@
+import os
+from functools import lru_cache
+import importlib.util
+
+import httpx
+from langchain.chat_models import init_chat_model
+
+from embeddingsUtiles import load_embedding_model
+
+# HTTP/2 needs the optional h2 package; without it the pooled clients fall back to HTTP/1.1 keep-alive
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+
+@lru_cache(maxsize=None)
+def _http_clients():
+    """
+    One sync and one async HTTP client shared by every chat model, so connections
+    (and their TLS handshakes) are reused across requests.
+    """
+    return (
+        httpx.Client(http2=_HTTP2, timeout=60, limits=_LIMITS),
+        httpx.AsyncClient(http2=_HTTP2, timeout=60, limits=_LIMITS),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_llm(model="deepseek-reasoner", temperature=0):
+    """
+    Returns a shared DeepSeek chat model.
+
+    Parameters:
+    - model: The DeepSeek model name. Defaults to "deepseek-reasoner".
+    - temperature: Sampling temperature. Defaults to 0.
+
+    Returns:
+    - A chat model instance, created once per (model, temperature) and backed by pooled HTTP clients.
+    """
+    http_client, http_async_client = _http_clients()
+    return init_chat_model(
+        model=model,
+        api_key=os.getenv("DEEPSEEK_API_KEY"),
+        base_url=os.getenv("DEEPSEEK_BASE_URL"),
+        model_provider="openai",
+        temperature=temperature,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_embedding_model(model_name="BAAI/bge-large-en-v1.5"):
+    """
+    Returns a shared embedding model, loaded once per model name.
+
+    Parameters:
+    - model_name: The HuggingFace model name passed to load_embedding_model.
+
+    Returns:
+    - An instance of BGEEmbeddings.
+    """
+    return load_embedding_model(model_name=model_name)
@@ -1,8 +1,11 @@
-import fitz  # PyMuPDF
+import pymupdf
 from langchain_core.documents import Document
 from docling.document_converter import DocumentConverter
 from langchain_community.vectorstores import Chroma
 import uuid
+import os
+import pickle
+import xxhash
 
 def retrieve_context(query, retriever, remove_duplicates=True):
     """
@@ -172,6 +175,50 @@ def load_pdf_docling(files="data/2306.02707.pdf"):
 
     return documents
 
+def load_pdf_docling_cached(files="data/2306.02707.pdf", cache_dir=".cache"):
+    """
+    Same as load_pdf_docling, but keeps the converted Documents in a pickle on disk.
+
+    Parameters:
+    - files: A string representing a single file path or a list of strings representing multiple file paths.
+    - cache_dir: Directory for the cached conversions. Defaults to ".cache".
+
+    Returns:
+    - A list of Document objects, loaded from the cache when the files are unchanged.
+
+    Note:
+    - The cache key covers each path, modification time and size, so editing or replacing
+      a PDF triggers a fresh Docling conversion.
+    """
+    if not isinstance(files, list):
+        files = [files]  # Ensure 'files' is always a list
+
+    hasher = xxhash.xxh128()
+    for file_path in files:
+        stat = os.stat(file_path)
+        hasher.update(f"{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}\0".encode())
+    cache_path = os.path.join(cache_dir, f"docling-{hasher.hexdigest()}.pkl")
+
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                documents = pickle.load(f)
+            print(f"Loaded {len(documents)} Docling document(s) from cache")
+            return documents
+        except Exception as e:
+            print(f"Ignoring unreadable Docling cache {cache_path}: {e}")
+
+    documents = load_pdf_docling(files)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so an interrupted run never leaves a truncated cache entry
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(documents, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+    return documents
+
 def load_pdf(files="data/2306.02707.pdf"):
     """
     Loads documents from PDF files using PyMuPDF.
@@ -194,13 +241,9 @@ def load_pdf(files="data/2306.02707.pdf"):
     documents = []
     for file_path in files:
         try:
-            # Open the PDF file
-            doc = fitz.open(file_path)
-            text = ""
-            # Extract text from each page
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text += page.get_text("text")
+            # Open the PDF file and extract text from each page, joined once rather than concatenated per page
+            with pymupdf.open(file_path) as doc:
+                text = "".join(page.get_text("text") for page in doc)
 
             # Apply post-processing steps
             text = clean_extra_whitespace(text)